@@ -0,0 +1,112 @@
+"""
+Approximate nearest-neighbour benchmark
+Measures recall@k of the IVF index against exact search, and p50/p99 query
+latency of both, across corpus sizes and probe counts.
+
+Synthetic embeddings are drawn around random topic centres so the corpus is
+clustered like real document embeddings; uniformly random vectors are the
+worst case for any partitioned index.
+
+Run from the backend directory:
+    python -m benchmarks.ann_benchmark --sizes 200000 500000 --probes 16 64 0
+"""
+
+import argparse
+import time
+from typing import Callable, List, Tuple
+
+import numpy as np
+
+from services.ann_index import IVFIndex
+from services.context_provider import top_k_similar
+
+
+def synthetic_corpus(
+    rows: int, dim: int, topics: int, spread: float, rng: np.random.Generator
+) -> np.ndarray:
+    centres = rng.standard_normal((topics, dim)).astype(np.float32)
+    matrix = np.empty((rows, dim), dtype=np.float32)
+    for start in range(0, rows, 100_000):
+        end = min(rows, start + 100_000)
+        topic = rng.integers(0, topics, end - start)
+        matrix[start:end] = centres[topic] + spread * rng.standard_normal(
+            (end - start, dim), dtype=np.float32
+        )
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix
+
+
+def timed(fn: Callable[[], Tuple[np.ndarray, np.ndarray]]) -> Tuple[float, np.ndarray]:
+    start = time.perf_counter()
+    rows, _ = fn()
+    return (time.perf_counter() - start) * 1000, rows
+
+
+def percentiles(samples: List[float]) -> str:
+    p50, p99 = np.percentile(samples, [50, 99])
+    return f"p50={p50:7.2f}ms  p99={p99:7.2f}ms"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[200_000, 500_000])
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--topics", type=int, default=2_000)
+    parser.add_argument(
+        "--spread", type=float, default=1.5, help="Noise around topic centres; higher is harder"
+    )
+    parser.add_argument(
+        "--probes", type=int, nargs="+", default=[16, 64, 0], help="0 is the configured default"
+    )
+    parser.add_argument(
+        "--lists", type=int, default=0, help="IVF partitions, 0 uses the configured default"
+    )
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        rng = np.random.default_rng(0)
+        matrix = synthetic_corpus(size, args.dim, args.topics, args.spread, rng)
+        # Queries are corpus rows moved by noise of norm ~0.3, like questions
+        # about a passage
+        noise = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+        queries = matrix[rng.integers(0, size, args.queries)] + 0.3 * noise / np.sqrt(
+            args.dim
+        )
+
+        start = time.perf_counter()
+        index, permutation = IVFIndex.build(matrix, n_lists=args.lists or None)
+        build_s = time.perf_counter() - start
+        grouped = matrix[permutation]
+        print(
+            f"{size} rows x {args.dim} dims: {index.n_lists} lists, "
+            f"built in {build_s:.1f}s"
+        )
+
+        exact_ms, exact_rows = [], []
+        for query in queries:
+            ms, rows = timed(lambda: top_k_similar(matrix, query, args.top_k))
+            exact_ms.append(ms)
+            exact_rows.append(set(rows.tolist()))
+        print(f"  exact          recall=1.000  {percentiles(exact_ms)}")
+
+        for n_probe in args.probes:
+            n_probe = n_probe or index.default_n_probe
+            ann_ms, hits = [], 0
+            for query, expected in zip(queries, exact_rows):
+                ms, rows = timed(
+                    lambda: index.search(grouped, query, args.top_k, n_probe=n_probe)
+                )
+                ann_ms.append(ms)
+                # Map grouped rows back to original rows before comparing
+                hits += len(expected & set(permutation[rows].tolist()))
+            recall = hits / (args.top_k * len(queries))
+            print(
+                f"  n_probe={n_probe:<5}  recall={recall:.3f}  {percentiles(ann_ms)}  "
+                f"speedup={np.median(exact_ms) / np.median(ann_ms):.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
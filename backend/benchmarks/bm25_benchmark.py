@@ -0,0 +1,77 @@
+"""
+BM25 retrieval benchmark
+Measures index build time, memory and p50/p99 query latency of the local
+BM25 index, which answers retrieval_mode=bm25 without an embeddings call.
+
+Chunks are drawn from a Zipf-distributed vocabulary, with an occasional
+part-number style code, so posting list lengths resemble real prose.
+
+Run from the backend directory:
+    python -m benchmarks.bm25_benchmark --chunks 10000 100000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from services.bm25_index import BM25Index
+
+
+def synthetic_chunks(
+    count: int, words_per_chunk: int, vocabulary: int, rng: np.random.Generator
+) -> list:
+    words = np.array([f"w{i}" for i in range(vocabulary)])
+    chunks = []
+    for _ in range(count):
+        ids = np.minimum(rng.zipf(1.2, words_per_chunk), vocabulary) - 1
+        text = " ".join(words[ids])
+        chunks.append(f"{text} PN-{rng.integers(0, 100_000)}")
+    return chunks
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chunks", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--words", type=int, default=150, help="Words per chunk")
+    parser.add_argument("--vocabulary", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    for count in args.chunks:
+        rng = np.random.default_rng(0)
+        chunks = synthetic_chunks(count, args.words, args.vocabulary, rng)
+
+        start = time.perf_counter()
+        index = BM25Index()
+        for position, text in enumerate(chunks):
+            index.add(position, text)
+        index.compact()
+        build_s = time.perf_counter() - start
+
+        # Half keyword questions, half lookups of a code from a random chunk
+        queries = []
+        for i in range(args.queries):
+            text = chunks[rng.integers(0, count)]
+            tokens = text.split()
+            if i % 2:
+                queries.append(f"what is {tokens[-1]}")
+            else:
+                queries.append(" ".join(rng.choice(tokens[:-1], 4)))
+
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            index.search(query, args.top_k)
+            latencies.append((time.perf_counter() - start) * 1000)
+        p50, p99 = np.percentile(latencies, [50, 99])
+        print(
+            f"{count} chunks: built in {build_s:.1f}s, "
+            f"{index.memory_bytes() / 2**20:.1f} MB, "
+            f"p50={p50:.3f}ms  p99={p99:.3f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
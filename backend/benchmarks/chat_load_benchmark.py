@@ -0,0 +1,306 @@
+"""
+Chat streaming load test
+Opens concurrent EventSource-style /chat/stream connections across many
+chat_ids, stepping the concurrency up, and records time-to-first-token,
+inter-frame gaps and completion time percentiles per step.
+
+By default the backend and the fake OpenAI server are started as separate
+processes, so the load generator does not compete with them for the GIL.
+While each step runs, /health is probed; its latency rising with load
+points at work blocking the event loop. Pass --url to test a backend that
+is already running instead.
+
+The backend is started with a single worker process: ingestion jobs and
+the document registry live in the process that handled the upload, so
+with more workers chats and job polls routed to another one fail.
+
+Run from the backend directory:
+    python -m benchmarks.chat_load_benchmark --concurrency 1 10 50 100 --duration 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import httpx
+import numpy as np
+
+from benchmarks.synthetic_pdf import write_pdf
+
+
+# Not imported from end_to_end_benchmark, which loads the backend settings
+# and so would require an OpenAI key in this process
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {}
+    p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+    return {
+        "p50": round(float(p50), 2),
+        "p90": round(float(p90), 2),
+        "p99": round(float(p99), 2),
+        "max": round(float(max(samples)), 2),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@dataclass
+class StepResult:
+    """Samples collected at one concurrency level"""
+
+    concurrency: int
+    ttft_ms: List[float] = field(default_factory=list)
+    gap_ms: List[float] = field(default_factory=list)
+    completion_ms: List[float] = field(default_factory=list)
+    health_ms: List[float] = field(default_factory=list)
+    errors: int = 0
+    seconds: float = 0.0
+
+    def to_dict(self) -> Dict:
+        completed = len(self.completion_ms)
+        return {
+            "concurrency": self.concurrency,
+            "completed": completed,
+            "errors": self.errors,
+            "requests_per_second": round(completed / self.seconds, 2) if self.seconds else 0,
+            "ttft_ms": percentiles(self.ttft_ms),
+            "inter_frame_gap_ms": percentiles(self.gap_ms),
+            "completion_ms": percentiles(self.completion_ms),
+            "health_ms": percentiles(self.health_ms),
+        }
+
+
+async def stream_chat(
+    client: httpx.AsyncClient, result: StepResult, chat_id: str, message: str, document_id: str
+) -> None:
+    """One chat request, read frame by frame like an EventSource"""
+    start = time.perf_counter()
+    last_frame = None
+    params = {"message": message, "chat_id": chat_id, "document_id": document_id}
+    try:
+        async with client.stream("GET", "/chat/stream", params=params) as response:
+            if response.status_code != 200:
+                result.errors += 1
+                return
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                now = time.perf_counter()
+                event = json.loads(line[len("data: "):])
+                if event.get("type") == "content":
+                    if last_frame is None:
+                        result.ttft_ms.append((now - start) * 1000)
+                    else:
+                        result.gap_ms.append((now - last_frame) * 1000)
+                    last_frame = now
+                elif event.get("type") == "error":
+                    result.errors += 1
+                    return
+    except httpx.HTTPError:
+        result.errors += 1
+        return
+    result.completion_ms.append((time.perf_counter() - start) * 1000)
+
+
+async def run_step(
+    base_url: str, concurrency: int, duration_s: float, chats: int, document_id: str
+) -> StepResult:
+    """Keep `concurrency` streams open for `duration_s`, then let them finish"""
+    result = StepResult(concurrency)
+    limits = httpx.Limits(max_connections=concurrency + 1, max_keepalive_connections=concurrency + 1)
+    timeout = httpx.Timeout(300, connect=30)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        deadline = time.perf_counter() + duration_s
+        counter = iter(range(10**9))
+
+        async def worker(worker_id: int) -> None:
+            while time.perf_counter() < deadline:
+                n = next(counter)
+                # Unique questions keep the query embedding and answer caches cold
+                await stream_chat(
+                    client,
+                    result,
+                    f"load-{(worker_id + n) % chats}",
+                    f"What does section {n} say about the pump valve?",
+                    document_id,
+                )
+
+        async def probe_health() -> None:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    await client.get("/health")
+                    result.health_ms.append((time.perf_counter() - start) * 1000)
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(0.1)
+
+        start = time.perf_counter()
+        await asyncio.gather(probe_health(), *(worker(i) for i in range(concurrency)))
+        result.seconds = time.perf_counter() - start
+    return result
+
+
+def upload_document(base_url: str, pdf_path: Path) -> str:
+    with httpx.Client(base_url=base_url, timeout=300) as client:
+        with open(pdf_path, "rb") as f:
+            body = client.post("/upload-pdf", files={"file": (pdf_path.name, f)}).json()
+        if "job_id" not in body:
+            raise RuntimeError(f"Upload failed: {body}")
+        job_id = body["job_id"]
+        while body.get("status") not in ("completed", "failed"):
+            time.sleep(0.1)
+            response = client.get(f"/jobs/{job_id}")
+            if response.status_code == 404:
+                # Jobs are per process; the poll reached another worker
+                raise RuntimeError(
+                    f"Job {job_id} is unknown to the backend; "
+                    "is it running more than one worker?"
+                )
+            body = response.json()
+    if body["status"] != "completed":
+        raise RuntimeError(f"Ingestion failed: {body.get('error')}")
+    return body["document_id"]
+
+
+def wait_until_up(url: str, timeout_s: float = 30) -> None:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up")
+
+
+@contextmanager
+def local_backend(args: argparse.Namespace, data_dir: Path) -> Iterator[str]:
+    """Start the fake OpenAI server and the backend as child processes"""
+    fake_port, backend_port = free_port(), free_port()
+    fake = subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.fake_openai",
+            "--port", str(fake_port),
+            "--latency-ms", str(args.latency_ms),
+            "--first-token-ms", str(args.first_token_ms),
+            "--tokens-per-second", str(args.tokens_per_second),
+            "--completion-tokens", str(args.completion_tokens),
+            "--error-rate", str(args.error_rate),
+        ],
+        stdout=subprocess.DEVNULL,
+    )
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "fake-key"),
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{fake_port}/v1",
+        "DOCUMENT_STORE_DIR": str(data_dir / "documents"),
+        "MESSAGE_STORE_PATH": str(data_dir / "messages.sqlite3"),
+        "EMBEDDING_CACHE_PATH": str(data_dir / "embedding_cache.sqlite3"),
+        "UPLOAD_DIR": str(data_dir / "uploads"),
+    }
+    backend = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--port", str(backend_port),
+            "--log-level", "warning",
+        ],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{backend_port}"
+    try:
+        wait_until_up(f"{base_url}/health")
+        yield base_url
+    finally:
+        for process in (backend, fake):
+            process.terminate()
+            process.wait()
+
+
+def print_step(step: Dict, baseline: Optional[Dict]) -> None:
+    ttft = step["ttft_ms"].get("p50", 0)
+    degradation = ""
+    if baseline and baseline["ttft_ms"].get("p50"):
+        degradation = f" ({ttft / baseline['ttft_ms']['p50']:.2f}x)"
+    print(
+        f"  concurrency={step['concurrency']:<4} {step['requests_per_second']:6.1f} req/s  "
+        f"TTFT p50={ttft:7.1f}ms{degradation} p99={step['ttft_ms'].get('p99', 0):7.1f}ms  "
+        f"gap p99={step['inter_frame_gap_ms'].get('p99', 0):6.1f}ms  "
+        f"done p50={step['completion_ms'].get('p50', 0):7.1f}ms  "
+        f"health p99={step['health_ms'].get('p99', 0):6.1f}ms  errors={step['errors']}",
+        file=sys.stderr,
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", help="Test this running backend instead of starting one")
+    parser.add_argument("--document-id", help="Document to chat with when --url is given")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 25, 50, 100])
+    parser.add_argument("--duration", type=float, default=15, help="Seconds per step")
+    parser.add_argument("--chats", type=int, default=1000, help="Distinct chat_ids")
+    parser.add_argument("--pages", type=int, default=50, help="Synthetic PDF size")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Embeddings request latency")
+    parser.add_argument("--first-token-ms", type=float, default=200)
+    parser.add_argument("--tokens-per-second", type=float, default=50)
+    parser.add_argument("--completion-tokens", type=int, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="Write the JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp)
+        if args.url:
+            backend = nullcontext(args.url.rstrip("/"))
+        else:
+            backend = local_backend(args, data_dir)
+        with backend as base_url:
+            document_id = args.document_id
+            if not document_id:
+                pdf_path = write_pdf(str(data_dir / "load.pdf"), args.pages)
+                document_id = upload_document(base_url, pdf_path)
+
+            steps, baseline = [], None
+            print(f"Load test against {base_url}, {args.duration:.0f}s per step", file=sys.stderr)
+            for concurrency in args.concurrency:
+                result = asyncio.run(
+                    run_step(base_url, concurrency, args.duration, args.chats, document_id)
+                )
+                step = result.to_dict()
+                print_step(step, baseline)
+                baseline = baseline or step
+                steps.append(step)
+
+    report = {
+        "benchmark": "chat_load",
+        "timestamp": datetime.now().isoformat(),
+        "config": vars(args),
+        "steps": steps,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
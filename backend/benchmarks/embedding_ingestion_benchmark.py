@@ -0,0 +1,87 @@
+"""
+Embedding ingestion benchmark
+Embeds a synthetic document against the local fake OpenAI server with
+sequential and concurrent batch dispatch, then again with the server
+rate limiting, and reports wall-clock speedup
+
+Run from the backend directory:
+    python -m benchmarks.embedding_ingestion_benchmark
+"""
+
+import argparse
+import logging
+import sys
+import time
+
+from benchmarks.fake_openai import FakeOpenAIConfig, FakeOpenAIServer
+from config import settings
+from services.context_provider import ContextProvider
+
+
+def synthetic_chunks(count: int) -> list:
+    return [
+        f"Section {i}: the pump valve assembly (part {i:05d}) must be torqued "
+        f"to specification before the sensor is calibrated. " * 4
+        for i in range(count)
+    ]
+
+
+def run_ingestion(texts: list, concurrency: int) -> tuple:
+    """Embed texts with the given concurrency, return (seconds, failed)"""
+    settings.embedding_max_concurrency = concurrency
+    provider = ContextProvider()
+    start = time.perf_counter()
+    embeddings = provider._embed_texts(texts)
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for embedding in embeddings if not embedding)
+    return elapsed, failed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Embedding ingestion benchmark")
+    parser.add_argument("--chunks", type=int, default=400)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    texts = synthetic_chunks(args.chunks)
+    settings.embedding_batch_size = args.batch_size
+    settings.embedding_cache_enabled = False
+    settings.openai_api_key = settings.openai_api_key or "fake-key"
+
+    config = FakeOpenAIConfig(latency_s=args.latency_ms / 1000, embedding_dim=256)
+    with FakeOpenAIServer(config) as server:
+        settings.openai_base_url = server.base_url
+
+        sequential_s, sequential_failed = run_ingestion(texts, 1)
+        concurrent_s, concurrent_failed = run_ingestion(texts, args.concurrency)
+
+        # Let the server accept only half the workers at once to exercise
+        # the 429 retry path
+        config.max_concurrent = max(1, args.concurrency // 2)
+        limited_s, limited_failed = run_ingestion(texts, args.concurrency)
+        rate_limited = server.rate_limited
+
+    print(f"{args.chunks} chunks, batch size {args.batch_size}, {args.latency_ms:.0f} ms/request")
+    print(f"  sequential:            {sequential_s:6.2f}s  failed={sequential_failed}")
+    print(
+        f"  concurrency={args.concurrency:<2}        {concurrent_s:6.2f}s  "
+        f"failed={concurrent_failed}  speedup={sequential_s / concurrent_s:.1f}x"
+    )
+    print(
+        f"  concurrency={args.concurrency:<2} w/ 429s  {limited_s:6.2f}s  "
+        f"failed={limited_failed}  speedup={sequential_s / limited_s:.1f}x  "
+        f"429 responses={rate_limited}"
+    )
+
+    ok = (
+        sequential_failed == concurrent_failed == limited_failed == 0
+        and concurrent_s < sequential_s
+    )
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""
+Embedding storage benchmark
+Compares memory per chunk, retrieval quality and query latency of float32,
+float16 and int8 embedding storage, at full and reduced dimensions.
+
+Quality is measured against exact float32 search on the full vectors:
+recall@k of the top-k rows and the mean absolute error of their scores.
+Synthetic vectors spread information evenly over all dimensions, so the
+reduced-dimension rows understate what models trained for truncation
+(text-embedding-3) retain.
+
+Run from the backend directory:
+    python -m benchmarks.embedding_storage_benchmark --rows 50000 --dims 1536 512 256
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.ann_benchmark import synthetic_corpus
+from services.context_provider import top_k_similar
+from services.embedding_storage import (
+    STORAGE_DTYPES,
+    load_embeddings,
+    quantize,
+    save_embeddings,
+    truncate_dimensions,
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--dims", type=int, nargs="+", default=[1536, 512, 256])
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    matrix = synthetic_corpus(args.rows, args.dim, args.topics, 1.5, rng)
+    noise = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    queries = matrix[rng.integers(0, args.rows, args.queries)] + 0.3 * noise / np.sqrt(
+        args.dim
+    )
+
+    exact = [top_k_similar(matrix, query, args.top_k) for query in queries]
+    baseline_bytes = matrix.nbytes / args.rows
+    # What List[List[float]] costs: a boxed float (24 B) plus a list slot (8 B)
+    print(
+        f"{args.rows} rows x {args.dim} dims, top_k={args.top_k}; "
+        f"Python lists would use {args.dim * 32 / 1024:.1f} KB per chunk"
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for dims in args.dims:
+            reduced = truncate_dimensions(matrix, dims)
+            for dtype in STORAGE_DTYPES:
+                directory = Path(tmp) / f"{dtype}-{dims}"
+                directory.mkdir()
+                save_embeddings(directory, *quantize(reduced, dtype))
+                stored, scales = load_embeddings(directory, mmap=True)
+                bytes_per_row = (stored.nbytes + (scales.nbytes if scales is not None else 0)) / args.rows
+
+                hits, errors, latencies = 0, [], []
+                for query, (exact_rows, exact_scores) in zip(queries, exact):
+                    start = time.perf_counter()
+                    rows, _ = top_k_similar(stored, query[:dims], args.top_k, scales)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    hits += len(set(rows.tolist()) & set(exact_rows.tolist()))
+                    # Score error on the exact top-k rows
+                    approx = top_k_similar(
+                        stored[exact_rows],
+                        query[:dims],
+                        args.top_k,
+                        scales[exact_rows] if scales is not None else None,
+                    )
+                    approx_scores = np.empty(args.top_k, dtype=np.float32)
+                    approx_scores[approx[0]] = approx[1]
+                    errors.append(np.abs(approx_scores - exact_scores).mean())
+
+                print(
+                    f"  {dtype:<8} dims={dims:<5} {bytes_per_row / 1024:6.2f} KB/chunk "
+                    f"({baseline_bytes / bytes_per_row:4.1f}x smaller than float32)  "
+                    f"recall@{args.top_k}={hits / (args.top_k * len(queries)):.3f}  "
+                    f"score_err={np.mean(errors):.5f}  "
+                    f"p50={np.percentile(latencies, 50):6.2f}ms"
+                )
+                del stored
+
+
+if __name__ == "__main__":
+    main()
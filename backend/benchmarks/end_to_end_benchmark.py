@@ -0,0 +1,254 @@
+"""
+End-to-end benchmark
+Runs PDF processing, ingestion, retrieval and the /chat/stream endpoint
+against the local fake OpenAI server on synthetic PDFs of increasing size,
+and writes the results as JSON so runs can be compared over time.
+
+Everything the app persists goes to a temporary directory; the fake
+server's latency, token rate and error rate are configurable.
+
+Run from the backend directory:
+    python -m benchmarks.end_to_end_benchmark --pages 10 100 500 --output e2e.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import socket
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+import numpy as np
+import uvicorn
+
+from benchmarks.fake_openai import FakeOpenAIConfig, FakeOpenAIServer
+from benchmarks.synthetic_pdf import write_pdf
+from config import settings
+from services.context_provider import ContextProvider
+from services.pdf_processor import PDFProcessor
+
+# Every query of a run is unique so the query embedding cache never answers
+QUERIES = (
+    "How do I calibrate the pressure sensor in section {n}?",
+    "Which gasket fits the pump housing of assembly {n}?",
+    "What is maintenance procedure {n:04d}?",
+    "How is motor controller {n} configured?",
+    "When should the filter seal of unit {n} be replaced?",
+)
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {
+        "p50": round(float(p50), 3),
+        "p95": round(float(p95), 3),
+        "p99": round(float(p99), 3),
+        "max": round(float(max(samples)), 3),
+    }
+
+
+_query_numbers = itertools.count()
+
+
+def next_query() -> str:
+    n = next(_query_numbers)
+    return QUERIES[n % len(QUERIES)].format(n=n)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def bench_pipeline(pdf_path: Path) -> Dict:
+    processor = PDFProcessor(pdf_path=str(pdf_path))
+    start = time.perf_counter()
+    ok = processor.process_pipeline()
+    return {
+        "ok": ok,
+        "seconds": round(time.perf_counter() - start, 3),
+        "chunks": len(processor.chunks),
+    }
+
+
+def bench_initialize(pdf_path: Path) -> tuple:
+    provider = ContextProvider(pdf_path=str(pdf_path), document_id=pdf_path.stem)
+    start = time.perf_counter()
+    ok = provider.initialize()
+    result = {
+        "ok": ok,
+        "seconds": round(time.perf_counter() - start, 3),
+        "chunks": len(provider.chunks),
+        "failed_embeddings": provider.failed_embeddings,
+        "batches_embedded": provider.batches_embedded,
+    }
+    return provider, result
+
+
+def bench_retrieval(provider: ContextProvider, queries: int) -> Dict:
+    async def run() -> List[float]:
+        latencies = []
+        for _ in range(queries):
+            start = time.perf_counter()
+            await provider._find_relevant_chunks(next_query())
+            latencies.append((time.perf_counter() - start) * 1000)
+        return latencies
+
+    return {"retrieval_mode": settings.retrieval_mode, "ms": percentiles(asyncio.run(run()))}
+
+
+def bench_chat(base_url: str, pdf_path: Path, queries: int) -> Dict:
+    """Upload through the API, then time chat requests over SSE"""
+    with httpx.Client(base_url=base_url, timeout=300) as client:
+        with open(pdf_path, "rb") as f:
+            upload = client.post("/upload-pdf", files={"file": (pdf_path.name, f)})
+        upload.raise_for_status()
+        body = upload.json()
+        start = time.perf_counter()
+        while body.get("status") not in ("completed", "failed"):
+            time.sleep(0.05)
+            body = client.get(f"/jobs/{body['job_id']}").json()
+        ingestion_s = time.perf_counter() - start
+        document_id = body["document_id"]
+
+        ttft, totals, errors = [], [], 0
+        stages: Dict[str, List[float]] = {}
+        for n in range(queries):
+            start = time.perf_counter()
+            first_content = None
+            params = {"message": next_query(), "chat_id": f"bench-{n}", "document_id": document_id}
+            with client.stream("GET", "/chat/stream", params=params) as response:
+                for line in response.iter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    event = json.loads(line[len("data: "):])
+                    if event.get("type") == "content" and first_content is None:
+                        first_content = time.perf_counter()
+                    elif event.get("type") == "error":
+                        errors += 1
+                    elif event.get("type") == "done":
+                        for stage, ms in event.get("timings_ms", {}).items():
+                            stages.setdefault(stage, []).append(ms)
+            totals.append((time.perf_counter() - start) * 1000)
+            if first_content is not None:
+                ttft.append((first_content - start) * 1000)
+
+    return {
+        "ingestion_seconds": round(ingestion_s, 3),
+        "ingestion_status": body.get("status"),
+        "ttft_ms": percentiles(ttft),
+        "total_ms": percentiles(totals),
+        "errors": errors,
+        "server_stage_ms": {stage: percentiles(ms) for stage, ms in stages.items()},
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 300])
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=50, help="Embeddings request latency")
+    parser.add_argument("--first-token-ms", type=float, default=200)
+    parser.add_argument("--tokens-per-second", type=float, default=100)
+    parser.add_argument("--completion-tokens", type=int, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="Write the JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    config = FakeOpenAIConfig(
+        latency_s=args.latency_ms / 1000,
+        embedding_dim=256,
+        first_token_s=args.first_token_ms / 1000,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate,
+    )
+
+    with tempfile.TemporaryDirectory() as tmp, FakeOpenAIServer(config) as fake:
+        data_dir = Path(tmp)
+        settings.openai_api_key = settings.openai_api_key or "fake-key"
+        settings.openai_base_url = fake.base_url
+        settings.embedding_cache_enabled = False
+        settings.document_store_dir = str(data_dir / "documents")
+        settings.message_store_path = str(data_dir / "messages.sqlite3")
+        settings.upload_dir = str(data_dir / "uploads")
+
+        # Imported late so the app's stores open in the temporary directory
+        from main import app
+
+        port = free_port()
+        server = uvicorn.Server(
+            uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+        )
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.05)
+
+        results = []
+        try:
+            for pages in args.pages:
+                # A different seed per size keeps documents from sharing a hash
+                pdf_path = write_pdf(str(data_dir / f"synthetic-{pages}.pdf"), pages, seed=pages)
+                provider, initialize = bench_initialize(pdf_path)
+                result = {
+                    "pages": pages,
+                    "process_pipeline": bench_pipeline(pdf_path),
+                    "initialize": initialize,
+                    "retrieval": bench_retrieval(provider, args.queries),
+                    "chat_stream": bench_chat(f"http://127.0.0.1:{port}", pdf_path, args.queries),
+                }
+                results.append(result)
+                print(
+                    f"{pages:>5} pages: pipeline {result['process_pipeline']['seconds']:.2f}s, "
+                    f"initialize {initialize['seconds']:.2f}s, "
+                    f"retrieval p50 {result['retrieval']['ms'].get('p50', 0):.1f}ms, "
+                    f"chat TTFT p50 {result['chat_stream']['ttft_ms'].get('p50', 0):.0f}ms",
+                    file=sys.stderr,
+                )
+        finally:
+            server.should_exit = True
+            thread.join()
+
+        report = {
+            "benchmark": "end_to_end",
+            "timestamp": datetime.now().isoformat(),
+            "config": vars(args),
+            "settings": {
+                "retrieval_mode": settings.retrieval_mode,
+                "embedding_batch_size": settings.embedding_batch_size,
+                "embedding_max_concurrency": settings.embedding_max_concurrency,
+                "embedding_storage_dtype": settings.embedding_storage_dtype,
+            },
+            "fake_server": fake.stats(),
+            "results": results,
+        }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+    failed = any(
+        not r["process_pipeline"]["ok"]
+        or not r["initialize"]["ok"]
+        or r["chat_stream"]["ingestion_status"] != "completed"
+        for r in results
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
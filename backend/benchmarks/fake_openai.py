@@ -0,0 +1,280 @@
+"""
+Local stand-in for the OpenAI API
+Serves deterministic embeddings and (streaming) chat completions with
+configurable latency, token rate, rate limiting and error injection so
+ingestion and chat can be benchmarked offline
+
+Run standalone:
+    python -m benchmarks.fake_openai --port 8100 --latency-ms 100
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+import numpy as np
+
+
+@dataclass
+class FakeOpenAIConfig:
+    """Behaviour of the fake server"""
+
+    latency_s: float = 0.1  # Fixed delay per embeddings request
+    embedding_dim: int = 1536
+    max_concurrent: int = 0  # Requests in flight before answering 429 (0 = unlimited)
+    retry_after_ms: int = 200  # Retry hint sent with 429 responses
+    first_token_s: float = 0.2  # Chat delay before the first token
+    tokens_per_second: float = 50  # Chat token rate after the first token (0 = instant)
+    completion_tokens: int = 50  # Tokens in every chat answer
+    error_rate: float = 0.0  # Fraction of requests answered with error_status
+    error_status: int = 500
+    seed: int = 0  # Seeds error injection so runs are repeatable
+
+
+def fake_embedding(text: str, dim: int) -> List[float]:
+    """Deterministic pseudo-random embedding derived from the text"""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    return np.random.default_rng(seed).standard_normal(dim).astype(np.float32).tolist()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; without this, delayed ACKs add
+    # ~40 ms to every response
+    disable_nagle_algorithm = True
+    server: "_FakeHTTPServer"
+
+    def log_message(self, format, *args):  # Keep benchmark output clean
+        pass
+
+    def _send_json(self, status: int, payload: dict, headers: dict = None) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, data: bytes) -> None:
+        """Write one piece of a chunked transfer-encoded body"""
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        if self.path.endswith("/embeddings"):
+            handler = self._embeddings
+        elif self.path.endswith("/chat/completions"):
+            handler = self._chat_completions
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        fake = self.server.fake
+        if not fake.enter():
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit reached", "type": "requests"}},
+                {"retry-after-ms": str(fake.config.retry_after_ms)},
+            )
+            return
+        try:
+            if fake.inject_error():
+                self._send_json(
+                    fake.config.error_status,
+                    {"error": {"message": "Injected error", "type": "server_error"}},
+                )
+                return
+            handler(request)
+        finally:
+            fake.leave()
+
+    def _embeddings(self, request: dict) -> None:
+        fake = self.server.fake
+        time.sleep(fake.config.latency_s)
+        inputs = request.get("input", [])
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        tokens = sum(max(1, len(text) // 4) for text in inputs)
+        self._send_json(
+            200,
+            {
+                "object": "list",
+                "model": request.get("model"),
+                "data": [
+                    {
+                        "object": "embedding",
+                        "index": i,
+                        "embedding": fake_embedding(text, fake.config.embedding_dim),
+                    }
+                    for i, text in enumerate(inputs)
+                ],
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            },
+        )
+
+    def _chat_completions(self, request: dict) -> None:
+        config = self.server.fake.config
+        prompt = "".join(message.get("content", "") for message in request.get("messages", []))
+        tokens = [f"tok{i} " for i in range(config.completion_tokens)]
+        usage = {
+            "prompt_tokens": max(1, len(prompt) // 4),
+            "completion_tokens": len(tokens),
+            "total_tokens": max(1, len(prompt) // 4) + len(tokens),
+        }
+        base = {
+            "id": "chatcmpl-fake",
+            "created": int(time.time()),
+            "model": request.get("model"),
+        }
+        time.sleep(config.first_token_s)
+
+        if not request.get("stream"):
+            if config.tokens_per_second:
+                time.sleep((len(tokens) - 1) / config.tokens_per_second)
+            self._send_json(
+                200,
+                {
+                    **base,
+                    "object": "chat.completion",
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": "".join(tokens)},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": usage,
+                },
+            )
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(choices: list, **extra) -> None:
+            payload = {**base, "object": "chat.completion.chunk", "choices": choices, **extra}
+            self._send_chunk(f"data: {json.dumps(payload)}\n\n".encode())
+
+        for i, token in enumerate(tokens):
+            if i and config.tokens_per_second:
+                time.sleep(1 / config.tokens_per_second)
+            event([{"index": 0, "delta": {"content": token}, "finish_reason": None}])
+        event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if request.get("stream_options", {}).get("include_usage"):
+            event([], usage=usage)
+        self._send_chunk(b"data: [DONE]\n\n")
+        self._send_chunk(b"")
+
+
+class _FakeHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    fake: "FakeOpenAIServer"
+
+
+class FakeOpenAIServer:
+    """Threaded fake OpenAI server, usable as a context manager"""
+
+    def __init__(self, config: FakeOpenAIConfig = None, port: int = 0):
+        self.config = config or FakeOpenAIConfig()
+        self._httpd = _FakeHTTPServer(("127.0.0.1", port), _Handler)
+        self._httpd.fake = self
+        self._thread = None
+        self._lock = threading.Lock()
+        self._rng = random.Random(self.config.seed)
+        self.in_flight = 0
+        self.requests = 0
+        self.rate_limited = 0
+        self.errors_injected = 0
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}/v1"
+
+    def enter(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            if self.config.max_concurrent and self.in_flight >= self.config.max_concurrent:
+                self.rate_limited += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def inject_error(self) -> bool:
+        if not self.config.error_rate:
+            return False
+        with self._lock:
+            if self._rng.random() >= self.config.error_rate:
+                return False
+            self.errors_injected += 1
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "rate_limited": self.rate_limited,
+                "errors_injected": self.errors_injected,
+            }
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local fake OpenAI API server")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--max-concurrent", type=int, default=0)
+    parser.add_argument("--first-token-ms", type=float, default=200)
+    parser.add_argument("--tokens-per-second", type=float, default=50)
+    parser.add_argument("--completion-tokens", type=int, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = FakeOpenAIConfig(
+        latency_s=args.latency_ms / 1000,
+        max_concurrent=args.max_concurrent,
+        first_token_s=args.first_token_ms / 1000,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate,
+    )
+    server = FakeOpenAIServer(config, port=args.port)
+    print(f"Fake OpenAI API listening on {server.base_url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Message store load test
+Fills the SQLite message store with a large history, then measures append,
+history and paginated read latency against it.
+
+Run from the backend directory:
+    python -m benchmarks.message_store_benchmark --messages 1000000
+"""
+
+import argparse
+import logging
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+
+import numpy as np
+
+from services.message_store import AI, HUMAN, SQLiteMessageStore
+
+MESSAGE = "How do I replace the pressure valve gasket on the main pump housing?"
+
+
+def latencies_ms(fn: Callable[[], object], repeats: int) -> List[float]:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(name: str, samples: List[float]) -> None:
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    print(f"  {name:<30} p50={p50:8.3f}ms  p95={p95:8.3f}ms  p99={p99:8.3f}ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--chats", type=int, default=10_000)
+    parser.add_argument("--repeats", type=int, default=2_000)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    rng = random.Random(0)
+    chat_ids = [f"chat-{i}" for i in range(args.chats)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteMessageStore(db_path=str(Path(tmp) / "messages.sqlite3"))
+
+        start = time.perf_counter()
+        for i in range(args.messages):
+            store.append(rng.choice(chat_ids), HUMAN if i % 2 == 0 else AI, MESSAGE)
+        store.flush()
+        fill_s = time.perf_counter() - start
+        print(
+            f"{args.messages} messages in {args.chats} chats: "
+            f"stored in {fill_s:.1f}s ({args.messages / fill_s:,.0f} messages/s)"
+        )
+
+        report(
+            "append",
+            latencies_ms(lambda: store.append(rng.choice(chat_ids), HUMAN, MESSAGE), args.repeats),
+        )
+        flush_samples = []
+        for _ in range(20):
+            for _ in range(store.batch_size):
+                store.append(rng.choice(chat_ids), HUMAN, MESSAGE)
+            flush_samples += latencies_ms(store.flush, 1)
+        report(f"commit {store.batch_size}-message batch", flush_samples)
+
+        report(
+            "recent(chat, 10)",
+            latencies_ms(lambda: store.recent(rng.choice(chat_ids), 10), args.repeats),
+        )
+        report(
+            "page(chat, limit=50)",
+            latencies_ms(lambda: store.page(rng.choice(chat_ids), None, 50), args.repeats),
+        )
+        report(
+            "page(all, cursor, limit=1000)",
+            latencies_ms(
+                lambda: store.page(None, str(rng.randrange(args.messages)), 1000),
+                args.repeats // 10,
+            ),
+        )
+        report("list(all)", latencies_ms(store.list, 1))
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+PDF page extraction benchmark
+Compares serial and process-parallel text extraction in PDFProcessor.load_pdf
+and reports throughput in pages per second
+
+Run from the backend directory:
+    python -m benchmarks.pdf_extraction_benchmark --pages 1000 --workers 2 4
+"""
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.synthetic_pdf import write_pdf
+from config import settings
+from services.pdf_processor import PDFProcessor
+
+
+def run_extraction(pdf_path: Path, workers: int) -> tuple:
+    """Return (seconds, pages extracted, raw_text length)"""
+    settings.pdf_extraction_workers = workers
+    settings.pdf_parallel_min_pages = 1
+    processor = PDFProcessor(pdf_path=str(pdf_path))
+    start = time.perf_counter()
+    if not processor.load_pdf():
+        raise RuntimeError("Extraction failed")
+    return time.perf_counter() - start, len(processor.pages_text), len(processor.raw_text)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="PDF page extraction benchmark")
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=[2, max(2, os.cpu_count() or 1)]
+    )
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = write_pdf(Path(tmp) / "synthetic.pdf", args.pages)
+        print(f"{args.pages} pages, {os.cpu_count()} CPUs")
+
+        serial_s, serial_pages, serial_chars = run_extraction(pdf_path, 1)
+        print(f"  serial:      {serial_s:6.2f}s  {serial_pages / serial_s:8.1f} pages/s")
+
+        for workers in sorted(set(args.workers)):
+            parallel_s, pages, chars = run_extraction(pdf_path, workers)
+            assert (pages, chars) == (serial_pages, serial_chars), "output differs"
+            print(
+                f"  workers={workers:<3} {parallel_s:6.2f}s  {pages / parallel_s:8.1f} pages/s  "
+                f"speedup={serial_s / parallel_s:.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
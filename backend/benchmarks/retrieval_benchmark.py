@@ -0,0 +1,93 @@
+"""
+Retrieval microbenchmark
+Compares the original per-chunk Python loop against the vectorized top-k
+search used by ContextProvider, across increasing chunk counts.
+
+Run from the backend directory:
+    python -m benchmarks.retrieval_benchmark
+"""
+
+import argparse
+import time
+from typing import Callable, List
+
+import numpy as np
+
+from services.context_provider import build_embedding_matrix, top_k_similar
+
+EMBEDDING_DIM = 1536  # text-embedding-ada-002
+
+
+def legacy_top_k(
+    chunk_embeddings: List[List[float]], query: List[float], top_k: int
+) -> np.ndarray:
+    """The pre-vectorization implementation, kept here as a baseline"""
+    similarities = []
+    for chunk_embedding in chunk_embeddings:
+        if chunk_embedding:
+            vec1, vec2 = np.array(query), np.array(chunk_embedding)
+            similarities.append(
+                np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
+            )
+        else:
+            similarities.append(0.0)
+    return np.argsort(similarities)[::-1][:top_k]
+
+
+def time_call(fn: Callable[[], object], repeats: int) -> float:
+    """Return the median wall-clock time of fn in milliseconds"""
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return float(np.median(samples))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1_000, 5_000, 20_000, 50_000]
+    )
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument(
+        "--skip-legacy", action="store_true", help="Only time the vectorized path"
+    )
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    query = rng.standard_normal(EMBEDDING_DIM).tolist()
+
+    print(f"{'chunks':>8} {'build ms':>10} {'legacy ms':>10} {'vector ms':>10} {'speedup':>8}")
+    for size in args.sizes:
+        embeddings = rng.standard_normal((size, EMBEDDING_DIM)).tolist()
+
+        start = time.perf_counter()
+        matrix, row_ids = build_embedding_matrix(embeddings)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        vector_ms = time_call(
+            lambda: top_k_similar(matrix, query, args.top_k), args.repeats
+        )
+        if args.skip_legacy:
+            legacy_ms = float("nan")
+        else:
+            legacy_ms = time_call(
+                lambda: legacy_top_k(embeddings, query, args.top_k),
+                max(1, args.repeats // 2),
+            )
+
+        rows, _ = top_k_similar(matrix, query, args.top_k)
+        if not args.skip_legacy:
+            expected = legacy_top_k(embeddings, query, args.top_k)
+            assert list(row_ids[rows]) == list(expected), "result mismatch"
+
+        print(
+            f"{size:>8} {build_ms:>10.1f} {legacy_ms:>10.2f} {vector_ms:>10.3f} "
+            f"{legacy_ms / vector_ms:>7.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
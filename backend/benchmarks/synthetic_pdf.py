@@ -0,0 +1,73 @@
+"""
+Synthetic PDF generator
+Writes text-only PDFs of any page count without third-party dependencies
+"""
+
+import random
+from pathlib import Path
+
+VOCABULARY = (
+    "pump valve sensor torque manifold gasket bearing calibrate install "
+    "configure inspect replace pressure flow error code section manual "
+    "assembly housing bracket coupling seal filter motor controller"
+).split()
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def page_lines(page_number: int, lines_per_page: int, rng: random.Random) -> list:
+    lines = [f"Section {page_number}: maintenance procedure {page_number:04d}"]
+    for _ in range(lines_per_page):
+        words = [rng.choice(VOCABULARY) for _ in range(rng.randint(8, 14))]
+        lines.append(" ".join(words).capitalize() + ".")
+    return lines
+
+
+def write_pdf(path: str, pages: int, lines_per_page: int = 45, seed: int = 0) -> Path:
+    """Write a PDF with `pages` pages of deterministic pseudo-text"""
+    rng = random.Random(seed)
+    font_ref = 3 + pages * 2
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        (
+            "<< /Type /Pages /Kids ["
+            + " ".join(f"{3 + i * 2} 0 R" for i in range(pages))
+            + f"] /Count {pages} >>"
+        ).encode(),
+    ]
+    for page in range(pages):
+        operations = ["BT /F1 10 Tf 50 770 Td 14 TL"]
+        operations += [f"({_escape(line)}) '" for line in page_lines(page + 1, lines_per_page, rng)]
+        operations.append("ET")
+        stream = "\n".join(operations).encode("latin-1")
+        objects.append(
+            (
+                "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                f"/Resources << /Font << /F1 {font_ref} 0 R >> >> "
+                f"/Contents {4 + page * 2} 0 R >>"
+            ).encode()
+        )
+        objects.append(
+            b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+        )
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_offset = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref_offset,
+    )
+
+    path = Path(path)
+    path.write_bytes(bytes(output))
+    return path
@@ -1,5 +1,5 @@
 import os
-from typing import List
+from typing import List, Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -15,16 +15,80 @@ class Settings(BaseSettings):
     openai_model: str = "gpt-3.5-turbo"
     openai_temperature: float = 0.1
     openai_max_tokens: int = 500
+    openai_base_url: Optional[str] = None  # Override to point at a proxy or stand-in
+    openai_max_connections: int = 100  # Shared pool for ingestion and chat
+    openai_max_keepalive_connections: int = 20  # Idle connections kept open for reuse
+    openai_keepalive_expiry_s: float = 60
+    openai_http2: bool = False  # Multiplex requests over one connection (needs h2)
+    openai_timeout_s: float = 60  # Default per-request timeout
+    openai_connect_timeout_s: float = 5
+    query_embedding_timeout_s: float = 10  # The query embedding blocks the chat reply
     
     # PDF Configuration
     pdf_path: str = ""  # No default PDF - users will upload their own
     max_file_size_mb: int = 30  # Maximum PDF file size in MB
+    upload_dir: str = "data/uploads"  # Uploads waiting for or in ingestion
+    ingestion_workers: int = 2  # PDFs processed in parallel
+    pdf_extraction_workers: int = 1  # Processes per PDF for page text extraction
+    pdf_parallel_min_pages: int = 64  # Smaller PDFs are always extracted serially
+    ingestion_job_history: int = 100  # Finished jobs kept for status queries
+    document_store_dir: str = "data/documents"  # Persisted document indexes
+    document_memory_budget_mb: int = 512  # Resident index memory before LRU eviction
     
     # Context Provider Configuration
     top_k_chunks: int = 5
     similarity_threshold: float = 0.1
     embedding_model: str = "text-embedding-ada-002"
-    embedding_batch_size: int = 100
+    embedding_batch_size: int = 100  # Max inputs per embeddings request
+    embedding_batch_max_tokens: int = 20000  # Max tokens per embeddings request
+    embedding_max_concurrency: int = 4  # Embedding requests in flight at once
+    embedding_max_retries: int = 5
+    query_embedding_cache_size: int = 10000  # Cached query embeddings (0 disables)
+    query_embedding_cache_ttl_s: float = 3600
+    answer_cache_enabled: bool = False  # Replay answers to repeated questions
+    answer_cache_size: int = 1000
+    answer_cache_ttl_s: float = 3600
+    embedding_cache_enabled: bool = True
+    embedding_cache_path: str = "data/embedding_cache.sqlite3"
+    embedding_storage_dtype: str = "int8"  # float32, float16 or int8 (per-row scaled)
+    embedding_dimensions: int = 0  # Keep only the first N dimensions, 0 keeps all
+    embedding_mmap: bool = True  # Memory-map saved embeddings instead of reading them
+    ann_index_enabled: bool = True  # Approximate search for large documents
+    ann_min_chunks: int = 200000  # Smaller documents use exact search
+    ann_n_lists: int = 0  # IVF partitions, 0 picks 4 * sqrt(chunks)
+    ann_probe_fraction: float = 0.1  # Share of partitions scored per query; higher is slower but more exact
+    ann_n_probe: int = 16  # Minimum partitions scored per query
+    ann_kmeans_iterations: int = 10
+    ann_train_sample: int = 50000  # Rows used to train the partitions
+    retrieval_mode: str = "vector"  # vector, bm25 (local keyword search) or hybrid
+    hybrid_candidates: int = 20  # Chunks taken from each retriever before fusion
+    hybrid_rrf_k: int = 60  # Reciprocal-rank fusion constant; higher flattens ranks
+    
+    # Prompt Configuration
+    prompt_token_budget: int = 3000  # Prompt tokens, not counting the reply
+    prompt_context_share: float = 0.75  # Budget share for retrieved chunks over history
+    
+    # Chat History Configuration
+    message_store_backend: str = "sqlite"  # sqlite (durable) or memory
+    message_store_path: str = "data/messages.sqlite3"
+    message_write_batch_size: int = 500  # Messages committed per transaction
+    message_write_interval_ms: int = 50  # Max time a message waits to be written
+    max_messages_per_chat: int = 1000  # Memory backend drops older messages beyond this
+    summary_enabled: bool = True  # Summarize turns older than the history window
+    summary_model: Optional[str] = None  # Defaults to openai_model
+    summary_min_messages: int = 4  # Older messages needed before a summary update
+    summary_batch_messages: int = 40  # Max messages folded per summary call
+    summary_max_tokens: int = 300
+    summary_max_chats: int = 10000  # Summaries kept in memory, least recent dropped
+    
+    # Token Usage Configuration
+    token_history_size: int = 1000  # Most recent API calls kept in call_history
+    token_usage_bucket_s: int = 60  # Width of the aggregated usage buckets
+    token_usage_retention_hours: int = 24  # Longest window /tokens/usage can report
+    
+    # Streaming Configuration
+    sse_flush_interval_ms: int = 50  # Max time a content delta is buffered
+    sse_flush_max_bytes: int = 256  # Flush early once this much is buffered
     
     # CORS Configuration
     cors_origins: List[str] = ["http://localhost:3000", "http://127.0.0.1:3000"]
@@ -1,20 +1,29 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks, UploadFile, File
+from fastapi import FastAPI, HTTPException, BackgroundTasks, UploadFile, File, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 import logging
 from contextlib import asynccontextmanager
 from config import settings
-from services.context_provider import ContextProvider
+from services.context_provider import (
+    ContextProvider,
+    answer_cache,
+    query_embedding_cache,
+)
 from services.token_tracker import token_tracker
+from services.sse import stream_events, encode_event, is_content_frame
+from services.metrics import CHAT_STAGE_SECONDS, StageTimer, render_metrics
+from services.openai_clients import openai_clients
+from services.upload_store import UploadSizeLimitMiddleware, UploadStore, UploadTooLarge
+from services.ingestion_jobs import IngestionJob, IngestionJobManager
+from services.document_registry import DocumentInfo, DocumentRegistry
+from services.message_store import AI, HUMAN, create_message_store
+from services.conversation_memory import ConversationMemory
 import os
 from dotenv import load_dotenv
 import uvicorn
-import json
 import asyncio
-import tempfile
-from datetime import datetime
 
 # Load environment variables
 load_dotenv()
@@ -23,8 +32,23 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Global context provider instance
-context_provider: Optional[ContextProvider] = None
+# Indexes of all uploaded documents, keyed by content hash
+document_registry = DocumentRegistry()
+
+# Background PDF ingestion
+ingestion_jobs = IngestionJobManager()
+
+# Chat history, durable unless MESSAGE_STORE_BACKEND=memory
+messages_store = create_message_store()
+
+# PDFs on disk between upload and the end of their ingestion job
+upload_store = UploadStore()
+
+# Messages passed to the model as conversation history, including the new one
+HISTORY_MESSAGES = 10
+
+# Running summaries of the turns before the history window
+conversation_memory = ConversationMemory(messages_store, HISTORY_MESSAGES)
 
 
 @asynccontextmanager
@@ -32,10 +56,24 @@ async def lifespan(app: FastAPI):
     """Application lifespan events"""
     # Startup
     logger.info("🚀 Starting Context-Aware Chat App Backend")
-    logger.info("📄 No PDF loaded - waiting for user upload")
-    # Remove automatic initialization - users will upload their own PDFs
+    # One pooled client pair for every document, warmed before the first request
+    openai_clients.open()
+    upload_store.sweep()
+    # Documents indexed before a restart are listed right away and their
+    # arrays loaded on first use, so nothing is re-embedded
+    if document_registry.load_snapshots():
+        logger.info(f"📄 Active document: {document_registry.active_document_id}")
+    else:
+        logger.info("📄 No PDF loaded - waiting for user upload")
     yield
     # Shutdown
+    await conversation_memory.close()
+    # Running ingestions stop at their next group and are not persisted;
+    # wait for them so the clients below are closed only once unused
+    await asyncio.to_thread(ingestion_jobs.shutdown)
+    messages_store.close()
+    upload_store.close()
+    await openai_clients.close()
     logger.info("👋 Shutting down Context-Aware Chat App Backend")
 
 
@@ -46,6 +84,14 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# Cut off oversized uploads while the body is still arriving
+# (added first so CORS headers still wrap its 413 responses)
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    path="/upload-pdf",
+    max_bytes=settings.max_file_size_mb * 1024 * 1024,
+)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -53,6 +99,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 
@@ -61,31 +108,45 @@ class ChatMessage(BaseModel):
     id: Optional[str] = None
     message: str
     chat_id: str
+    role: Optional[str] = None
     timestamp: Optional[str] = None
 
 
 class ContextChatRequest(BaseModel):
     message: str
     chat_id: str
-
-
-# In-memory storage for demo (replace with database in production)
-messages_store: List[ChatMessage] = []
+    document_id: Optional[str] = None
 
 
 @app.get("/messages", response_model=List[ChatMessage])
-async def get_messages():
-    """Get all chat messages."""
-    return messages_store
+async def get_messages(
+    response: Response,
+    chat_id: Optional[str] = None,
+    cursor: Optional[str] = Query(None, pattern=r"^\d+$"),
+    limit: int = Query(100, ge=1, le=1000),
+    all_messages: bool = Query(False, alias="all"),
+):
+    """
+    Get chat messages, optionally only those of one chat, a page at a time.
+    Pass the X-Next-Cursor header of a page as `cursor` to get the next one.
+    `all=true` returns every message in one response instead.
+    """
+    if all_messages:
+        messages = await asyncio.to_thread(messages_store.list, chat_id)
+    else:
+        messages, next_cursor = await asyncio.to_thread(
+            messages_store.page, chat_id, cursor, limit
+        )
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+    return [ChatMessage(**msg.to_dict()) for msg in messages]
 
 
 @app.delete("/messages/clear/{chat_id}")
 async def clear_messages_by_chat(chat_id: str):
     """Clear messages for a specific chat."""
-    global messages_store
-    initial_count = len(messages_store)
-    messages_store = [msg for msg in messages_store if msg.chat_id != chat_id]
-    cleared_count = initial_count - len(messages_store)
+    cleared_count = await asyncio.to_thread(messages_store.clear, chat_id)
+    conversation_memory.clear(chat_id)
     logger.info(f"🗑️ Cleared {cleared_count} messages for chat {chat_id}")
     return {
         "message": f"Cleared {cleared_count} messages for chat {chat_id}",
@@ -94,210 +155,358 @@ async def clear_messages_by_chat(chat_id: str):
     }
 
 
-@app.post("/upload-pdf")
+@app.post("/upload-pdf", status_code=202)
 async def upload_pdf(file: UploadFile = File(...)):
     """
-    Upload a new PDF file and reinitialize the context provider.
+    Upload a new PDF file and queue it for background processing.
+    The current context stays live until the new one is ready.
     Maximum file size: 30MB
     """
-    global context_provider
-
     # Validate file type
     if not file.filename.endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
 
-    # Check file size (30MB limit)
+    # Check file size (30MB limit); oversized bodies are already cut off
+    # by UploadSizeLimitMiddleware while they arrive
     MAX_FILE_SIZE = settings.max_file_size_mb * 1024 * 1024  # Convert MB to bytes
 
-    # Read file content to check size
-    file_content = await file.read()
-    file_size = len(file_content)
-
-    if file_size > MAX_FILE_SIZE:
+    # Stream the upload to disk in chunks, hashing it on the way
+    try:
+        upload = await asyncio.to_thread(upload_store.save, file.file, MAX_FILE_SIZE)
+    except UploadTooLarge:
         raise HTTPException(
             status_code=400,
-            detail=f"File size ({file_size / (1024*1024):.1f}MB) exceeds maximum allowed size ({settings.max_file_size_mb}MB)",
+            detail=f"File exceeds maximum allowed size ({settings.max_file_size_mb}MB)",
         )
+    file_size = upload.size
 
     if file_size == 0:
+        upload_store.discard(upload.path)
         raise HTTPException(status_code=400, detail="File is empty")
 
-    try:
-        # Create a temporary file to save the uploaded PDF
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
-            # Write the file content to temp file
-            temp_file.write(file_content)
-            temp_pdf_path = temp_file.name
+    document_id = upload.document_id
+    temp_pdf_path = str(upload.path)
+
+    logger.info(
+        f"Queueing uploaded PDF: {file.filename} ({file_size / (1024*1024):.1f}MB)"
+    )
+    job = ingestion_jobs.submit(
+        file.filename, temp_pdf_path, run_ingestion, document_id=document_id
+    )
+    if job.pdf_path != temp_pdf_path:
+        # The same PDF is already being ingested; follow that job instead
+        upload_store.discard(upload.path)
+    return {
+        "message": f"PDF '{file.filename}' uploaded and queued for processing",
+        "filename": file.filename,
+        "document_id": document_id,
+        "file_size_mb": round(file_size / (1024 * 1024), 1),
+        "status": job.status,
+        "job_id": job.job_id,
+        "status_url": f"/jobs/{job.job_id}",
+        "events_url": f"/jobs/{job.job_id}/events",
+        "success": True,
+    }
 
-        # Update the PDF path in settings
-        settings.pdf_path = temp_pdf_path
 
-        # Reinitialize context provider with new PDF
+def run_ingestion(job: IngestionJob) -> Dict:
+    """Index a job's PDF on a worker thread and make it the active document"""
+    try:
+        return index_document(job)
+    finally:
+        # The PDF is not needed once its index exists (or failed to build)
+        upload_store.discard(job.pdf_path)
+
+
+def index_document(job: IngestionJob) -> Dict:
+    info = document_registry.get_info(job.document_id)
+    if info is not None and info.status == "ready" and not info.failed_embeddings:
+        # Same content was indexed before, just switch to it
+        document_registry.activate(job.document_id)
+        logger.info(f"📚 Document {job.document_id} already indexed, reusing it")
+        return {
+            **ingestion_result(info.document_id, info.chunks_count),
+            "failed_embeddings": 0,
+        }
+    if info is not None:
+        # Cached embeddings make this cheap; only the missing chunks hit the API
         logger.info(
-            f"Processing uploaded PDF: {file.filename} ({file_size / (1024*1024):.1f}MB)"
+            f"🔁 Re-indexing document {job.document_id}: "
+            f"{info.failed_embeddings} chunks have no embedding"
         )
-        context_provider = ContextProvider()
-        success = context_provider.initialize()
-
-        if success:
-            logger.info("✅ Context provider initialized successfully")
-            return {
-                "message": f"PDF '{file.filename}' uploaded and processed successfully",
-                "filename": file.filename,
-                "file_size_mb": round(file_size / (1024 * 1024), 1),
-                "status": "ready",
-                "chunks_count": len(context_provider.chunks),
-                # Include complete health status for frontend
-                "health_status": {
-                    "context_provider_ready": True,
-                    "pdf_loaded": True,
-                    "chunks_count": len(context_provider.chunks),
-                    "message": f"Ready with {len(context_provider.chunks)} chunks",
-                },
-                "success": True,
-            }
-        else:
-            logger.error("❌ Failed to initialize context provider")
-            return {
-                "message": "Failed to process the uploaded PDF",
-                "filename": file.filename,
-                "status": "error",
-                "health_status": {
-                    "context_provider_ready": False,
-                    "pdf_loaded": False,
-                    "chunks_count": 0,
-                    "message": "Failed to process PDF - please try again",
-                },
+
+    provider = ContextProvider(pdf_path=job.pdf_path, document_id=job.document_id)
+    # New chats switch to the document as soon as its first chunks are
+    # searchable; chats already streaming keep the provider they started with
+    try:
+        initialized = provider.initialize(
+            progress_callback=job.update_progress,
+            on_ready=lambda: document_registry.begin(provider, job.filename),
+            should_stop=lambda: job.is_cancelled,
+        )
+    except Exception:
+        document_registry.abort(job.document_id)
+        raise
+    if not initialized:
+        document_registry.abort(job.document_id)
+        if job.is_cancelled:
+            raise RuntimeError("Ingestion interrupted by server shutdown")
+        raise RuntimeError("Failed to process the uploaded PDF")
+
+    document_registry.register(provider, job.filename)
+    logger.info("✅ Context provider initialized successfully")
+
+    return {
+        **ingestion_result(job.document_id, len(provider.chunks)),
+        "embedding_cache": provider.embedding_cache_stats,
+        "failed_embeddings": provider.failed_embeddings,
+    }
+
+
+def ingestion_result(document_id: str, chunks_count: int) -> Dict:
+    return {
+        "document_id": document_id,
+        "chunks_count": chunks_count,
+        # Include complete health status for frontend
+        "health_status": {
+            "context_provider_ready": True,
+            "pdf_loaded": True,
+            "chunks_count": chunks_count,
+            "message": f"Ready with {chunks_count} chunks",
+        },
+    }
+
+
+def get_job_or_404(job_id: str) -> IngestionJob:
+    job = ingestion_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Get the status and progress of an ingestion job"""
+    return get_job_or_404(job_id).to_dict()
+
+
+async def generate_job_events(job: IngestionJob):
+    """Stream job progress until the job completes or fails"""
+    async for snapshot in ingestion_jobs.events(job):
+        if snapshot["status"] == "completed":
+            event = {"type": "done", "job": snapshot, "success": True}
+        elif snapshot["status"] == "failed":
+            event = {
+                "type": "error",
+                "error": snapshot["error"],
+                "job": snapshot,
                 "success": False,
             }
+        else:
+            event = {"type": "progress", "job": snapshot, "success": True}
+        yield encode_event(event)
 
-    except Exception as e:
-        logger.error(f"Error processing uploaded PDF: {e}")
-        raise HTTPException(
-            status_code=500,
-            detail={
-                "error": f"Error processing PDF: {str(e)}",
-                "health_status": {
-                    "context_provider_ready": False,
-                    "pdf_loaded": False,
-                    "chunks_count": 0,
-                    "message": "Error processing PDF - please try again",
-                },
-                "success": False,
-            },
-        )
+
+@app.get("/jobs/{job_id}/events")
+async def job_events_endpoint(job_id: str):
+    """Stream ingestion progress as Server-Sent Events"""
+    job = get_job_or_404(job_id)
+    return StreamingResponse(
+        generate_job_events(job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "Connection": "keep-alive"},
+    )
 
 
 @app.get("/health")
 async def health_check():
+    active = document_registry.get_info()
     return {
         "status": "healthy",
         "version": "1.0.0",
-        "context_provider_status": (
-            "ready"
-            if context_provider and context_provider.is_ready
-            else "no_pdf_loaded"
-        ),
-        "context_provider_ready": context_provider is not None
-        and context_provider.is_ready,
-        "pdf_loaded": context_provider is not None and context_provider.is_ready,
-        "chunks_count": (
-            len(context_provider.chunks)
-            if context_provider and context_provider.is_ready
-            else 0
-        ),
-        "message": (
-            f"Ready with {len(context_provider.chunks)} chunks"
-            if context_provider and context_provider.is_ready
-            else "Please upload a PDF file to start chatting"
-        ),
+        "context_provider_status": active.status if active else "no_pdf_loaded",
+        "context_provider_ready": active is not None,
+        "pdf_loaded": active is not None,
+        "active_document_id": active.document_id if active else None,
+        "chunks_count": active.chunks_count if active else 0,
+        "percent_indexed": active.percent_indexed if active else 0.0,
+        "registry": document_registry.stats(),
+        "message": health_message(active),
+    }
+
+
+def health_message(active: Optional[DocumentInfo]) -> str:
+    if active is None:
+        return "Please upload a PDF file to start chatting"
+    if active.status == "indexing":
+        return f"Indexing ({active.percent_indexed:.0f}%), {active.chunks_count} chunks searchable"
+    return f"Ready with {active.chunks_count} chunks"
+
+
+@app.get("/documents")
+async def list_documents():
+    """List all indexed documents and whether they are resident in memory"""
+    return {
+        "active_document_id": document_registry.active_document_id,
+        "documents": document_registry.list_documents(),
+        **document_registry.stats(),
     }
 
 
 @app.get("/tokens/usage")
-async def get_token_usage():
-    """Get current session token usage statistics"""
+async def get_token_usage(
+    window_minutes: Optional[int] = Query(
+        None, ge=1, le=settings.token_usage_retention_hours * 60
+    ),
+    top: int = Query(20, ge=1, le=1000),
+):
+    """
+    Get current session token usage statistics, or with `window_minutes`
+    the usage of that recent window broken down by type, model, document
+    and chat (the `top` documents and chats only).
+    """
     try:
-        stats = token_tracker.get_session_stats()
+        if window_minutes is None:
+            stats = token_tracker.get_session_stats()
+        else:
+            stats = token_tracker.get_window_usage(window_minutes, top)
         return {"success": True, "data": stats}
     except Exception as e:
         logger.error(f"Error fetching token usage: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch token usage")
 
 
-async def generate_chat_stream(request: ContextChatRequest):
-    """Generate streaming chat response"""
-    global context_provider, messages_store
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Chat and ingestion stage latency histograms and OpenAI connection reuse
+    counters in Prometheus text format
+    """
+    return PlainTextResponse(
+        render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
-    # Check if context provider is ready
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Get hit rates and sizes of the in-process caches"""
+    return {
+        "success": True,
+        "data": {
+            "query_embeddings": query_embedding_cache.stats(),
+            "answers": {
+                "enabled": settings.answer_cache_enabled,
+                **answer_cache.stats(),
+            },
+            "conversation_summaries": conversation_memory.stats(),
+            "openai_connections": openai_clients.connection_stats(),
+        },
+    }
+
+
+async def chat_events(request: ContextChatRequest, timer: StageTimer):
+    """Generate chat response events and store the exchange"""
+    # Evicted documents are reloaded from disk, keep that off the event loop
+    context_provider = await asyncio.to_thread(
+        document_registry.get, request.document_id
+    )
     if not context_provider or not context_provider.is_ready:
-        yield f"data: {json.dumps({'type': 'error', 'error': 'Context provider not initialized', 'success': False})}\n\n"
+        yield {
+            "type": "error",
+            "error": (
+                f"Unknown document {request.document_id}"
+                if request.document_id
+                else "Context provider not initialized"
+            ),
+            "success": False,
+        }
         return
 
     try:
-        # Store the user message
-        user_message = ChatMessage(
-            id=str(len(messages_store) + 1),
-            message=request.message,
-            chat_id=request.chat_id,
-            timestamp=datetime.now().isoformat(),
-        )
-        messages_store.append(user_message)
-
-        # Get message history for this chat (including the current message)
-        chat_messages = []
-        current_chat_messages = [
-            msg for msg in messages_store if msg.chat_id == request.chat_id
-        ]
-
-        # Build conversation history with proper role detection
-        for i, msg in enumerate(current_chat_messages):
-            # If it's the message we just added, it's a human message
-            if msg.message == request.message and i == len(current_chat_messages) - 1:
-                role = "human"
-            else:
-                # Alternate between human and AI based on position
-                # Odd positions (1st, 3rd, 5th...) are human messages
-                # Even positions (2nd, 4th, 6th...) are AI responses
-                role = "human" if i % 2 == 0 else "ai"
-
-            chat_messages.append(
-                {"role": role, "content": msg.message, "message": msg.message}
+        with timer.stage("history"):
+            # Store the user message; the store writes it to disk in the background
+            messages_store.append(request.chat_id, HUMAN, request.message)
+
+            # Recent history for this chat, ending with the current message. The
+            # summary covers older turns; the few messages it has not folded in
+            # yet are kept so nothing falls in between.
+            summary = conversation_memory.get(request.chat_id)
+            recent_messages = await asyncio.to_thread(
+                messages_store.recent,
+                request.chat_id,
+                HISTORY_MESSAGES + settings.summary_min_messages,
             )
+        summarized_through_id = summary.summarized_through_id if summary else 0
+        chat_messages = [
+            {"role": msg.role, "content": msg.message, "message": msg.message}
+            for msg in recent_messages
+            if int(msg.id) > summarized_through_id
+        ]
 
         # Stream the response with conversation history and store AI response
         ai_response_content = ""
-        for chunk in context_provider.chat_stream(request.message, chat_messages):
-            # Check if this is the completion chunk with accumulated content
+        async for chunk in context_provider.chat_stream(
+            request.message,
+            chat_messages,
+            summary.text if summary else None,
+            chat_id=request.chat_id,
+            timer=timer,
+        ):
+            if chunk.get("type") == "content":
+                timer.mark("first_content")
+
+            # Check if this is the completion chunk with accumulated content.
+            # The full answer is only needed server-side, so it is not resent.
             if chunk.get("type") == "done" and chunk.get("accumulated_content"):
-                ai_response_content = chunk["accumulated_content"]
+                ai_response_content = chunk.pop("accumulated_content")
 
                 # Store the AI response in the message store
-                ai_message = ChatMessage(
-                    id=str(len(messages_store) + 1),
-                    message=ai_response_content,
-                    chat_id=request.chat_id,
-                    timestamp=datetime.now().isoformat(),
-                )
-                messages_store.append(ai_message)
+                messages_store.append(request.chat_id, AI, ai_response_content)
+                conversation_memory.refresh(request.chat_id)
                 logger.info(
                     f"💬 Stored AI response for chat {request.chat_id}: {len(ai_response_content)} characters"
                 )
+            if chunk.get("type") == "done":
+                chunk["timings_ms"] = timer.breakdown_ms()
 
-            yield f"data: {json.dumps(chunk)}\n\n"
-            await asyncio.sleep(0.05)  # Small delay to prevent overwhelming the client
+            yield chunk
 
     except Exception as e:
         logger.error(f"Error in streaming chat endpoint: {e}")
-        yield f"data: {json.dumps({'type': 'error', 'error': str(e), 'success': False})}\n\n"
+        yield {"type": "error", "error": str(e), "success": False}
+
+
+async def generate_chat_stream(request: ContextChatRequest):
+    """Generate streaming chat response as coalesced SSE frames"""
+    timer = StageTimer(CHAT_STAGE_SECONDS)
+    first_frame = True
+    try:
+        async for frame in stream_events(chat_events(request, timer)):
+            if first_frame and is_content_frame(frame):
+                # Time the first delta spent in the SSE buffer and queue
+                first_frame = False
+                delivery = timer.since("first_content")
+                if delivery is not None:
+                    timer.add("sse_delivery", delivery)
+            yield frame
+    except Exception as e:
+        logger.error(f"Error in streaming chat endpoint: {e}")
+        yield encode_event({"type": "error", "error": str(e), "success": False})
+    finally:
+        timer.finish()
 
 
 @app.get("/chat/stream")
-async def chat_stream_endpoint(message: str, chat_id: str = "default"):
+async def chat_stream_endpoint(
+    message: str, chat_id: str = "default", document_id: Optional[str] = None
+):
     """
     Process a chat message using PDF context and return a streaming response.
+    Uses the most recently uploaded document unless document_id is given.
     """
-    request = ContextChatRequest(message=message, chat_id=chat_id)
+    request = ContextChatRequest(
+        message=message, chat_id=chat_id, document_id=document_id
+    )
     return StreamingResponse(
         generate_chat_stream(request),
         media_type="text/event-stream",
@@ -0,0 +1,183 @@
+"""
+Approximate nearest-neighbour search
+Inverted-file (IVF) index over normalized embeddings: rows are partitioned
+with spherical k-means and a query only scores the partitions whose
+centroids are closest to it
+"""
+
+import logging
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+from config import settings
+from services.embedding_storage import score
+
+logger = logging.getLogger(__name__)
+
+# Rows scored per matrix product when assigning rows to centroids
+ASSIGN_BLOCK_ROWS = 65536
+
+
+def _nearest_centroid(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the most similar centroid for every row"""
+    assignments = np.empty(len(data), dtype=np.int64)
+    for start in range(0, len(data), ASSIGN_BLOCK_ROWS):
+        block = data[start : start + ASSIGN_BLOCK_ROWS]
+        assignments[start : start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def _normalize(rows: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(rows, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return (rows / norms).astype(np.float32)
+
+
+def spherical_kmeans(
+    data: np.ndarray, n_clusters: int, iterations: int, seed: int = 0
+) -> np.ndarray:
+    """Cluster normalized rows by cosine similarity and return the centroids"""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = _nearest_centroid(data, centroids)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        order = np.argsort(assignments, kind="stable")
+        nonempty = counts > 0
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[nonempty]
+        centroids[nonempty] = np.add.reduceat(data[order], starts, axis=0)
+        # Reseed empty clusters so every partition stays useful
+        empty = np.flatnonzero(~nonempty)
+        if len(empty):
+            centroids[empty] = data[rng.choice(len(data), len(empty), replace=False)]
+        centroids = _normalize(centroids)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Partition layout over an embedding matrix whose rows are grouped by
+    partition: rows offsets[i]:offsets[i + 1] belong to centroid i.
+    """
+
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray):
+        self.centroids = centroids
+        self.offsets = offsets
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def default_n_probe(self) -> int:
+        """
+        Partitions scored per query. Probing a fixed share of the lists keeps
+        recall steady as the number of lists grows with the corpus.
+        """
+        n_probe = int(np.ceil(settings.ann_probe_fraction * self.n_lists))
+        return min(max(n_probe, settings.ann_n_probe, 1), self.n_lists)
+
+    @classmethod
+    def build(
+        cls,
+        matrix: np.ndarray,
+        n_lists: int = None,
+        iterations: int = None,
+        train_sample: int = None,
+        seed: int = 0,
+    ) -> Tuple["IVFIndex", np.ndarray]:
+        """
+        Train partitions on `matrix` (normalized rows). Returns the index and
+        the row permutation that groups the matrix by partition; the caller
+        must reorder its rows (and anything aligned with them) with it.
+        """
+        start = time.perf_counter()
+        rows = len(matrix)
+        n_lists = n_lists or settings.ann_n_lists or int(4 * np.sqrt(rows))
+        n_lists = max(1, min(n_lists, rows))
+        iterations = iterations or settings.ann_kmeans_iterations
+        train_sample = train_sample or settings.ann_train_sample
+
+        rng = np.random.default_rng(seed)
+        sample = matrix
+        if rows > max(train_sample, n_lists):
+            sample = matrix[np.sort(rng.choice(rows, max(train_sample, n_lists), replace=False))]
+        centroids = spherical_kmeans(sample, n_lists, iterations, seed)
+
+        assignments = _nearest_centroid(matrix, centroids)
+        permutation = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=n_lists)
+        offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        logger.info(
+            f"🧭 Built IVF index: {rows} rows in {n_lists} lists "
+            f"({time.perf_counter() - start:.2f}s)"
+        )
+        return cls(centroids, offsets), permutation
+
+    def search(
+        self,
+        matrix: np.ndarray,
+        query_embedding: np.ndarray,
+        top_k: int,
+        n_probe: int = None,
+        scales: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (row indices, cosine scores) of the approximate top_k rows, best first"""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = np.linalg.norm(query)
+        if len(matrix) == 0 or top_k <= 0 or query_norm == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = query / query_norm
+
+        n_probe = min(n_probe or self.default_n_probe, self.n_lists)
+        centroid_scores = self.centroids @ query
+        if n_probe < self.n_lists:
+            probes = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+        else:
+            probes = np.arange(self.n_lists)
+
+        # Each partition is a contiguous slice, so no rows are copied
+        row_parts, score_parts = [], []
+        for probe in probes:
+            start, end = self.offsets[probe], self.offsets[probe + 1]
+            if start < end:
+                row_parts.append(np.arange(start, end))
+                score_parts.append(
+                    score(
+                        matrix[start:end],
+                        query,
+                        scales[start:end] if scales is not None else None,
+                    )
+                )
+        if not score_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows = np.concatenate(row_parts)
+        scores = np.concatenate(score_parts)
+
+        k = min(top_k, len(scores))
+        if k < len(scores):
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        best = candidates[np.argsort(-scores[candidates])]
+        return rows[best], scores[best]
+
+    def save(self, directory: Path) -> None:
+        np.save(directory / "ivf_centroids.npy", self.centroids)
+        np.save(directory / "ivf_offsets.npy", self.offsets)
+
+    @classmethod
+    def load(cls, directory: Path) -> Optional["IVFIndex"]:
+        """Load a saved index, or None if the document was saved without one"""
+        if not (directory / "ivf_centroids.npy").exists():
+            return None
+        return cls(
+            np.load(directory / "ivf_centroids.npy"),
+            np.load(directory / "ivf_offsets.npy"),
+        )
+
+    def memory_bytes(self) -> int:
+        return self.centroids.nbytes + self.offsets.nbytes
@@ -0,0 +1,207 @@
+"""
+BM25 keyword retrieval
+Inverted index over chunk text scored with Okapi BM25, so keyword-style
+questions (part numbers, error codes, section titles) are answered locally
+without embedding the query
+"""
+
+import json
+import re
+import threading
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Words in any script, numbers and joined codes such as "E-1234", "3.2.1"
+# or "PN_55/A"
+TOKEN_PATTERN = re.compile(r"\w+(?:[-._/]\w+)*", re.UNICODE)
+CODE_SEPARATORS = re.compile(r"[-._/]")
+
+# Standard Okapi BM25 parameters
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    """Case-folded terms; joined codes are indexed whole and by their parts"""
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.casefold()):
+        terms.append(token)
+        if CODE_SEPARATORS.search(token):
+            terms.extend(part for part in CODE_SEPARATORS.split(token) if part)
+    return terms
+
+
+class BM25Index:
+    """
+    Append-only BM25 index keyed by chunk index.
+
+    Documents are added to per-term posting lists as chunks are created;
+    searches only see the compressed (CSR) copy, which the writer refreshes
+    with compact() so queries never pay for rebuilding it.
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self._doc_lengths: List[int] = []
+        self._lock = threading.Lock()
+        # Serializes compactions, which build outside self._lock
+        self._compact_lock = threading.Lock()
+        # Compressed layout: postings of term t are doc_ids/tfs[offsets[t]:offsets[t + 1]]
+        self._vocabulary: Dict[str, int] = {}
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._doc_ids = np.empty(0, dtype=np.int32)
+        self._term_freqs = np.empty(0, dtype=np.float32)
+        self._lengths = np.empty(0, dtype=np.float32)
+        self._compressed_docs = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+
+    def add(self, chunk_index: int, text: str) -> None:
+        """Index a chunk; chunk indexes must be added in order starting at 0"""
+        counts = Counter(tokenize(text))
+        with self._lock:
+            if chunk_index != len(self._doc_lengths):
+                raise ValueError(
+                    f"Expected chunk {len(self._doc_lengths)}, got {chunk_index}"
+                )
+            for term, count in counts.items():
+                self._pending[term].append((chunk_index, count))
+            self._doc_lengths.append(sum(counts.values()))
+
+    def search(
+        self, query: str, top_k: int, max_chunk_index: int = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (chunk indexes, BM25 scores) of the best matching chunks,
+        best first. Chunks at or beyond `max_chunk_index` are ignored, as
+        are chunks added since the last compact().
+        """
+        with self._lock:
+            vocabulary, offsets = self._vocabulary, self._offsets
+            doc_ids, term_freqs, lengths = self._doc_ids, self._term_freqs, self._lengths
+        docs = len(lengths)
+        if not docs or top_k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        average_length = max(float(lengths.mean()), 1.0)
+        scores = np.zeros(docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = offsets[term_id], offsets[term_id + 1]
+            postings, tf = doc_ids[start:end], term_freqs[start:end]
+            idf = np.log(1 + (docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            norm = K1 * (1 - B + B * lengths[postings] / average_length)
+            scores[postings] += idf * tf * (K1 + 1) / (tf + norm)
+
+        if max_chunk_index is not None:
+            scores[max_chunk_index:] = 0
+        matches = np.flatnonzero(scores)
+        if len(matches) > top_k:
+            matches = matches[np.argpartition(-scores[matches], top_k - 1)[:top_k]]
+        best = matches[np.argsort(-scores[matches], kind="stable")]
+        return best, scores[best]
+
+    def compact(self) -> None:
+        """
+        Merge documents added since the last compaction into the CSR arrays.
+        Called by the writer; the arrays are rebuilt outside the lock so
+        concurrent searches keep using the previous copy meanwhile.
+        """
+        with self._compact_lock:
+            with self._lock:
+                if self._compressed_docs == len(self._doc_lengths):
+                    return
+                pending, self._pending = self._pending, defaultdict(list)
+                doc_lengths = list(self._doc_lengths)
+                vocabulary = dict(self._vocabulary)
+                offsets, doc_ids, term_freqs = (
+                    self._offsets, self._doc_ids, self._term_freqs
+                )
+
+            new_term_ids: List[int] = []
+            new_doc_ids: List[int] = []
+            new_term_freqs: List[int] = []
+            for term, entries in pending.items():
+                term_id = vocabulary.setdefault(term, len(vocabulary))
+                new_term_ids.extend([term_id] * len(entries))
+                for doc_id, term_freq in entries:
+                    new_doc_ids.append(doc_id)
+                    new_term_freqs.append(term_freq)
+
+            # A stable sort by term keeps each posting list in document order,
+            # since every new document comes after the compressed ones
+            old_term_ids = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+            term_ids = np.concatenate((old_term_ids, new_term_ids)).astype(np.int64)
+            order = np.argsort(term_ids, kind="stable")
+            counts = np.bincount(term_ids, minlength=len(vocabulary))
+            doc_ids = np.concatenate(
+                (doc_ids, np.asarray(new_doc_ids, dtype=np.int32))
+            )[order]
+            term_freqs = np.concatenate(
+                (term_freqs, np.asarray(new_term_freqs, dtype=np.float32))
+            )[order]
+            offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+            with self._lock:
+                self._vocabulary = vocabulary
+                self._offsets = offsets
+                self._doc_ids = doc_ids
+                self._term_freqs = term_freqs
+                self._lengths = np.asarray(doc_lengths, dtype=np.float32)
+                self._compressed_docs = len(doc_lengths)
+
+    def memory_bytes(self) -> int:
+        # Vocabulary strings plus a rough dict entry overhead
+        vocabulary_bytes = sum(len(term) + 100 for term in self._vocabulary)
+        return (
+            vocabulary_bytes
+            + self._offsets.nbytes
+            + self._doc_ids.nbytes
+            + self._term_freqs.nbytes
+            + self._lengths.nbytes
+        )
+
+    def save(self, directory: Path) -> None:
+        self.compact()
+        with open(directory / "bm25_vocabulary.json", "w", encoding="utf-8") as f:
+            json.dump(list(self._vocabulary), f)
+        np.savez(
+            directory / "bm25.npz",
+            offsets=self._offsets,
+            doc_ids=self._doc_ids,
+            term_freqs=self._term_freqs,
+            lengths=self._lengths,
+        )
+
+    @classmethod
+    def load(cls, directory: Path) -> Optional["BM25Index"]:
+        """Load a saved index, or None if the document was saved without one"""
+        if not (directory / "bm25.npz").exists():
+            return None
+        index = cls()
+        with open(directory / "bm25_vocabulary.json", encoding="utf-8") as f:
+            terms = json.load(f)
+        arrays = np.load(directory / "bm25.npz")
+        index._vocabulary = {term: term_id for term_id, term in enumerate(terms)}
+        index._offsets = arrays["offsets"]
+        index._doc_ids = arrays["doc_ids"]
+        index._term_freqs = arrays["term_freqs"]
+        index._lengths = arrays["lengths"]
+        index._doc_lengths = index._lengths.astype(np.int64).tolist()
+        index._compressed_docs = len(index._doc_lengths)
+        return index
+
+    @classmethod
+    def from_chunks(cls, chunks) -> "BM25Index":
+        """Build an index over already created chunks"""
+        index = cls()
+        for position, chunk in enumerate(chunks):
+            index.add(position, chunk.content)
+        index.compact()
+        return index
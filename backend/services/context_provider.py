@@ -1,14 +1,33 @@
-from openai import OpenAI
+from openai import (
+    APIConnectionError,
+    AsyncOpenAI,
+    InternalServerError,
+    OpenAI,
+    RateLimitError,
+)
 import numpy as np
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, List, Dict, NamedTuple, Optional, Tuple
 from dataclasses import dataclass
+import hashlib
 import logging
 import sys
+import time
 
 sys.path.append("..")
 from config import settings
 from services.pdf_processor import PDFProcessor, DocumentChunk
 from services.token_tracker import token_tracker
+from services.embedding_cache import get_embedding_cache, text_digest
+from services.rate_limit import BackoffGate, backoff_delay, retry_after_seconds
+from services.ann_index import IVFIndex
+from services.bm25_index import BM25Index
+from services.metrics import CHAT_STAGE_SECONDS, INGESTION_STAGE_SECONDS, StageTimer
+from services.openai_clients import openai_clients
+from services.embedding_storage import quantize, resident_bytes, score, truncate_dimensions
+from services.prompt_builder import build_prompt
+from services.tokenizer import count_tokens
+from services.ttl_cache import TTLCache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -19,177 +38,638 @@ class RelevantChunk:
     """Represents a chunk with its relevance score"""
 
     chunk: DocumentChunk
-    similarity_score: float
+    similarity_score: float  # Cosine, BM25 or fused score depending on retrieval_mode
+
+
+class IndexSnapshot(NamedTuple):
+    """Searchable state of a document, replaced as a unit"""
+
+    matrix: np.ndarray  # Normalized embeddings in the storage dtype
+    row_ids: np.ndarray  # Chunk index of each matrix row
+    scales: Optional[np.ndarray] = None  # Per-row scales for int8 storage
+    ann_index: Optional[IVFIndex] = None
+
+
+def build_embedding_matrix(
+    embeddings: List[List[float]],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Pack embeddings into a contiguous, L2-normalized float32 matrix.
+
+    Empty or degenerate embeddings (failed batches, zero vectors) are left
+    out of the matrix entirely. Returns the matrix together with the chunk
+    index each of its rows belongs to.
+    """
+    dim = next((len(embedding) for embedding in embeddings if embedding), 0)
+    row_ids = [
+        i for i, embedding in enumerate(embeddings) if dim and len(embedding) == dim
+    ]
+
+    matrix = np.zeros((len(row_ids), dim), dtype=np.float32)
+    for row, chunk_index in enumerate(row_ids):
+        matrix[row] = embeddings[chunk_index]
+
+    norms = np.linalg.norm(matrix, axis=1)
+    valid = norms > 0
+    matrix = np.ascontiguousarray(matrix[valid] / norms[valid, None])
+    return matrix, np.asarray(row_ids, dtype=np.int64)[valid]
+
+
+def top_k_similar(
+    matrix: np.ndarray,
+    query_embedding: List[float],
+    top_k: int,
+    scales: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (row indices, cosine scores) of the top_k rows, best first.
+
+    Expects `matrix` rows to be L2-normalized, so a single matrix-vector
+    product yields cosine similarities. Rows may be stored compactly, see
+    embedding_storage. Only the top_k candidates are sorted; the rest are
+    selected with a linear-time partial sort.
+    """
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query_norm = np.linalg.norm(query)
+    if matrix.shape[0] == 0 or top_k <= 0 or query_norm == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    scores = score(matrix, query / query_norm, scales)
+    k = min(top_k, scores.shape[0])
+    if k < scores.shape[0]:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.shape[0])
+    order = candidates[np.argsort(-scores[candidates], kind="stable")]
+    return order, scores[order]
+
+
+# Query embeddings are document independent, so one cache serves every index
+query_embedding_cache = TTLCache(
+    maxsize=settings.query_embedding_cache_size,
+    ttl_s=settings.query_embedding_cache_ttl_s,
+)
+
+
+# Opt-in cache of complete answers for repeated questions on the same context
+answer_cache = TTLCache(
+    maxsize=settings.answer_cache_size if settings.answer_cache_enabled else 0,
+    ttl_s=settings.answer_cache_ttl_s,
+)
+
+
+def normalize_query(query: str) -> str:
+    """Canonical form of a query used for cache keys"""
+    return " ".join(query.split()).casefold()
 
 
 class ContextProvider:
     """Simplified context provider using OpenAI embeddings and LLM"""
 
-    def __init__(self, model: str = None):
-        logger.info(f"Initializing ContextProvider with pdf_path: {settings.pdf_path}")
-        self.pdf_path = settings.pdf_path
+    def __init__(
+        self, model: str = None, pdf_path: str = None, document_id: str = None
+    ):
+        self.pdf_path = pdf_path or settings.pdf_path
+        logger.info(f"Initializing ContextProvider with pdf_path: {self.pdf_path}")
+        self.document_id = document_id
         self.model = model or settings.openai_model
         self.pdf_processor = PDFProcessor(pdf_path=self.pdf_path)
-        self.client = OpenAI(api_key=settings.openai_api_key)
         self.chunks: List[DocumentChunk] = []
-        self.chunk_embeddings: List[List[float]] = []
-        self.is_ready = False
-
-    def initialize(self) -> bool:
-        """Initialize by processing PDF and generating embeddings once"""
+        # Keyword index over self.chunks, filled by the PDF processor as chunks
+        # are created; kept after the processor is released
+        self.bm25_index: BM25Index = self.pdf_processor.bm25_index
+        # Growable index storage, see _append_to_index
+        self._matrix_buffer: np.ndarray = np.empty((0, 0), dtype=np.float32)
+        self._row_id_buffer: np.ndarray = np.empty(0, dtype=np.int64)
+        # Swapped as a whole so readers always see a matching set of arrays
+        self._index = IndexSnapshot(self._matrix_buffer, self._row_id_buffer)
+        self.embedding_cache_stats = {"hits": 0, "misses": 0}
+        self.failed_embeddings = 0
+        self.batches_embedded = 0
+        self.percent_indexed = 0.0
+        self.is_ready = False  # Set once the first chunks are searchable
+        self.is_complete = False  # Set once the whole document is indexed
+
+    @property
+    def client(self) -> OpenAI:
+        """Shared sync client, used by ingestion threads"""
+        return openai_clients.sync_client
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """Shared async client for the request path, so chat never blocks the event loop"""
+        return openai_clients.async_client
+
+    @property
+    def embedding_matrix(self) -> np.ndarray:
+        """Normalized embeddings, one row per successfully embedded chunk"""
+        return self._index.matrix
+
+    @property
+    def embedding_row_ids(self) -> np.ndarray:
+        """Maps each row of embedding_matrix back to its index in self.chunks"""
+        return self._index.row_ids
+
+    @property
+    def embedding_scales(self) -> Optional[np.ndarray]:
+        """Per-row scales of an int8 embedding_matrix"""
+        return self._index.scales
+
+    @property
+    def ann_index(self) -> Optional[IVFIndex]:
+        """Partitions over embedding_matrix, built once a large document is complete"""
+        return self._index.ann_index
+
+    def initialize(
+        self,
+        progress_callback: Optional[Callable[..., None]] = None,
+        on_ready: Optional[Callable[[], None]] = None,
+        should_stop: Optional[Callable[[], bool]] = None,
+    ) -> bool:
+        """
+        Process the PDF and embed its chunks as pages stream in.
+
+        Chunks are embedded in groups and appended to the index as soon as
+        each group is done, so retrieval works on a partially indexed
+        document. `on_ready` is called once, when the first group is
+        searchable. `should_stop` is checked before every group; once it
+        returns True, processing stops and False is returned.
+        """
         logger.info("Initializing context provider...")
-
-        # Process PDF
-        if not self.pdf_processor.process_pipeline():
-            logger.error("Failed to process PDF")
+        pages = {"extracted": 0, "total": 0}
+        timer = StageTimer(INGESTION_STAGE_SECONDS)
+
+        def track_pages(**progress) -> None:
+            pages["extracted"] = progress.get("pages_extracted", pages["extracted"])
+            pages["total"] = progress.get("total_pages", pages["total"])
+            if progress_callback:
+                progress_callback(**progress)
+
+        def index_group(group: List[DocumentChunk]) -> None:
+            self.bm25_index = self.pdf_processor.bm25_index
+            with timer.stage("embed"):
+                self._index_chunks(group)
+            # Keyword search sees the new chunks from here on
+            self.bm25_index.compact()
+            if pages["total"]:
+                self.percent_indexed = round(100 * pages["extracted"] / pages["total"], 1)
+            if progress_callback:
+                progress_callback(
+                    stage="embedding",
+                    chunks_created=len(self.chunks),
+                    chunks_indexed=len(self.embedding_row_ids),
+                    batches_embedded=self.batches_embedded,
+                    percent_indexed=self.percent_indexed,
+                )
+            if not self.is_ready and len(self.embedding_row_ids):
+                self.is_ready = True
+                if on_ready:
+                    on_ready()
+
+        # Enough chunks per group to keep every embedding worker busy
+        group_size = settings.embedding_batch_size * settings.embedding_max_concurrency
+        group: List[DocumentChunk] = []
+        stopped = should_stop or (lambda: False)
+        try:
+            for chunk in self.pdf_processor.iter_chunks(track_pages, timer):
+                group.append(chunk)
+                if len(group) >= group_size:
+                    if stopped():
+                        break
+                    index_group(group)
+                    group = []
+            else:
+                if group and not stopped():
+                    index_group(group)
+        except Exception as e:
+            logger.error(f"Failed to process PDF: {e}")
+            return False
+        if stopped():
+            logger.warning("PDF processing interrupted, index discarded")
             return False
 
-        self.chunks = self.pdf_processor.chunks
-
-        # Generate embeddings for all chunks
-        logger.info("Generating embeddings for chunks...")
-        texts = [chunk.content for chunk in self.chunks]
-        self.chunk_embeddings = self._generate_embeddings_batch(texts)
+        with timer.stage("index_build"):
+            self._finalize_index()
+        timer.finish()
+        missing = len(self.chunks) - len(self.embedding_row_ids)
+        if missing:
+            logger.warning(f"{missing} chunks have no embedding and will be skipped")
 
+        self.percent_indexed = 100.0
         self.is_ready = True
+        self.is_complete = True
         logger.info(f"✅ Context provider initialized with {len(self.chunks)} chunks")
         return True
 
+    def _index_chunks(self, chunks: List[DocumentChunk]) -> None:
+        """Embed a group of chunks and append them to the searchable index"""
+        embeddings = self._generate_embeddings_batch([chunk.content for chunk in chunks])
+        matrix, row_ids = build_embedding_matrix(embeddings)
+        matrix = truncate_dimensions(matrix, settings.embedding_dimensions)
+        offset = len(self.chunks)
+        # Chunks go in first so published row ids always resolve
+        self.chunks.extend(chunks)
+        self._append_to_index(matrix, row_ids + offset)
+
+    def _append_to_index(self, matrix: np.ndarray, row_ids: np.ndarray) -> None:
+        """Append rows, growing the backing buffers geometrically"""
+        if not len(row_ids):
+            return
+        size = len(self.embedding_row_ids)
+        needed = size + len(row_ids)
+        if needed > len(self._row_id_buffer):
+            capacity = max(needed, 2 * len(self._row_id_buffer), 1024)
+            matrix_buffer = np.empty((capacity, matrix.shape[1]), dtype=np.float32)
+            row_id_buffer = np.empty(capacity, dtype=np.int64)
+            if size:
+                matrix_buffer[:size] = self.embedding_matrix
+                row_id_buffer[:size] = self.embedding_row_ids
+            self._matrix_buffer, self._row_id_buffer = matrix_buffer, row_id_buffer
+
+        # Rows past the published size are invisible to readers until the swap
+        self._matrix_buffer[size:needed] = matrix
+        self._row_id_buffer[size:needed] = row_ids
+        self._index = IndexSnapshot(
+            self._matrix_buffer[:needed], self._row_id_buffer[:needed]
+        )
+
+    def _finalize_index(self) -> None:
+        """Build the ANN index if worthwhile and convert to the storage dtype"""
+        matrix, row_ids = self.embedding_matrix, self.embedding_row_ids
+        ann_index = None
+        if settings.ann_index_enabled and len(row_ids) >= settings.ann_min_chunks:
+            # Partitions are trained on the full-precision rows
+            ann_index, permutation = IVFIndex.build(matrix)
+            # Rows map to chunks through row_ids, so they can be grouped by
+            # partition freely
+            matrix, row_ids = matrix[permutation], row_ids[permutation]
+        # Also drops the unused buffer capacity
+        matrix, scales = quantize(matrix, settings.embedding_storage_dtype)
+        self._set_index(matrix, row_ids.copy(), ann_index, scales)
+
+    def _set_index(
+        self,
+        matrix: np.ndarray,
+        row_ids: np.ndarray,
+        ann_index: Optional[IVFIndex] = None,
+        scales: Optional[np.ndarray] = None,
+    ) -> None:
+        self._matrix_buffer, self._row_id_buffer = matrix, row_ids
+        self._index = IndexSnapshot(matrix, row_ids, scales, ann_index)
+
+    @classmethod
+    def from_index(
+        cls,
+        document_id: str,
+        chunks: List[DocumentChunk],
+        embedding_matrix: np.ndarray,
+        embedding_row_ids: np.ndarray,
+        model: str = None,
+        ann_index: Optional[IVFIndex] = None,
+        embedding_scales: Optional[np.ndarray] = None,
+        bm25_index: Optional[BM25Index] = None,
+    ) -> "ContextProvider":
+        """Create a ready provider from a previously built index"""
+        provider = cls(model=model, document_id=document_id)
+        provider.chunks = chunks
+        # Documents saved before keyword search existed are indexed on load
+        provider.bm25_index = bm25_index or BM25Index.from_chunks(chunks)
+        provider._set_index(
+            embedding_matrix, embedding_row_ids, ann_index, embedding_scales
+        )
+        provider.percent_indexed = 100.0
+        provider.is_ready = True
+        provider.is_complete = True
+        return provider
+
+    def memory_bytes(self) -> int:
+        """Approximate resident size of the index, excluding memory-mapped arrays"""
+        # Chunk text plus a rough per-object overhead for DocumentChunk
+        chunk_bytes = sum(len(chunk.content) + 200 for chunk in self.chunks)
+        ann_bytes = self.ann_index.memory_bytes() if self.ann_index else 0
+        return (
+            resident_bytes(self._matrix_buffer)
+            + resident_bytes(self._row_id_buffer)
+            + resident_bytes(self.embedding_scales)
+            + ann_bytes
+            + self.bm25_index.memory_bytes()
+            + chunk_bytes
+        )
+
     def _generate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for multiple texts"""
-        embeddings = []
-        batch_size = settings.embedding_batch_size
+        """Generate embeddings for multiple texts, reusing cached ones"""
+        cache = get_embedding_cache()
+        digests = [text_digest(text) for text in texts]
+        known = (
+            cache.get_many(settings.embedding_model, digests) if cache else {}
+        )
 
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i : i + batch_size]
+        # Only embed each distinct uncached text once
+        pending = {}
+        for text, digest in zip(texts, digests):
+            if digest not in known:
+                pending.setdefault(digest, text)
+
+        hits = len(texts) - sum(digest not in known for digest in digests)
+        self.embedding_cache_stats["hits"] += hits
+        self.embedding_cache_stats["misses"] += len(pending)
+        logger.info(f"Embedding cache: {hits} hits, {len(pending)} misses")
+
+        fresh = self._embed_texts(list(pending.values()))
+        fresh_by_digest = {
+            digest: embedding
+            for digest, embedding in zip(pending.keys(), fresh)
+            if embedding
+        }
+        if cache:
+            cache.put_many(settings.embedding_model, fresh_by_digest)
+
+        known.update(fresh_by_digest)
+        return [known.get(digest, []) for digest in digests]
+
+    def _plan_embedding_batches(self, texts: List[str]) -> List[Tuple[int, int]]:
+        """Split texts into (start, end) ranges bounded by item and token count"""
+        batches = []
+        start = 0
+        batch_tokens = 0
+        for i, text in enumerate(texts):
+            tokens = count_tokens(text, settings.embedding_model)
+            if i > start and (
+                i - start >= settings.embedding_batch_size
+                or batch_tokens + tokens > settings.embedding_batch_max_tokens
+            ):
+                batches.append((start, i))
+                start, batch_tokens = i, 0
+            batch_tokens += tokens
+        if start < len(texts):
+            batches.append((start, len(texts)))
+        return batches
+
+    def _embed_batch_with_retry(
+        self, batch: List[str], gate: BackoffGate
+    ) -> Tuple[List[List[float]], Any]:
+        """Embed one batch, retrying transient and rate limit errors"""
+        # Retries are handled here so rate limits pause every worker at once
+        client = self.client.with_options(max_retries=0)
+        start = time.perf_counter()
+        for attempt in range(settings.embedding_max_retries + 1):
+            gate.wait()
             try:
-                response = self.client.embeddings.create(
+                response = client.embeddings.create(
                     model=settings.embedding_model, input=batch
                 )
+                INGESTION_STAGE_SECONDS.observe(
+                    "embed_batch", time.perf_counter() - start
+                )
+                # Map vectors back by their input position, never by order
+                data = sorted(response.data, key=lambda item: item.index)
+                if [item.index for item in data] != list(range(len(batch))):
+                    raise ValueError(
+                        f"Expected {len(batch)} embeddings, got {len(data)}"
+                    )
+                return [item.embedding for item in data], getattr(
+                    response, "usage", None
+                )
+            except (RateLimitError, APIConnectionError, InternalServerError) as e:
+                if attempt == settings.embedding_max_retries:
+                    raise
+                response = getattr(e, "response", None)
+                delay = retry_after_seconds(getattr(response, "headers", None))
+                if delay is None:
+                    delay = backoff_delay(attempt)
+                if isinstance(e, RateLimitError):
+                    gate.pause(delay)
+                else:
+                    gate.wait()
+                    time.sleep(delay)
+                logger.warning(
+                    f"Embedding batch failed ({type(e).__name__}), "
+                    f"retrying in {delay:.2f}s (attempt {attempt + 1})"
+                )
 
-                # Track token usage
-                if hasattr(response, "usage") and response.usage:
-                    token_tracker.track_embedding_usage(response.usage)
-
-                batch_embeddings = [data.embedding for data in response.data]
-                embeddings.extend(batch_embeddings)
-                logger.info(f"Generated embeddings for batch {i//batch_size + 1}")
-            except Exception as e:
-                logger.error(f"Failed to generate embeddings: {e}")
-                embeddings.extend([[] for _ in batch])
+    def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """Call the embeddings API for texts, in concurrent batches"""
+        embeddings: List[List[float]] = [[] for _ in texts]
+        batches = self._plan_embedding_batches(texts)
+        if not batches:
+            return embeddings
+
+        gate = BackoffGate()
+        workers = min(settings.embedding_max_concurrency, len(batches))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(self._embed_batch_with_retry, texts[start:end], gate): (
+                    start,
+                    end,
+                )
+                for start, end in batches
+            }
+            for completed, future in enumerate(as_completed(futures), 1):
+                start, end = futures[future]
+                try:
+                    batch_embeddings, usage = future.result()
+                except Exception as e:
+                    logger.error(
+                        f"Failed to generate embeddings for chunks {start}-{end - 1}: {e}"
+                    )
+                    self.failed_embeddings += end - start
+                else:
+                    embeddings[start:end] = batch_embeddings
+
+                    # Track token usage
+                    if usage:
+                        token_tracker.track_embedding_usage(
+                            usage, document_id=self.document_id
+                        )
+                    self.batches_embedded += 1
+                    logger.info(
+                        f"Generated embeddings for batch {completed}/{len(batches)}"
+                    )
 
         return embeddings
 
-    def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """Calculate cosine similarity between two vectors"""
-        vec1, vec2 = np.array(vec1), np.array(vec2)
-        return np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
-
-    def _find_relevant_chunks(
-        self, query: str, top_k: int = None
-    ) -> List[RelevantChunk]:
-        """Find most relevant chunks for the query"""
-        top_k = top_k or settings.top_k_chunks
+    async def _embed_query(
+        self, query: str, chat_id: str = None
+    ) -> Optional[np.ndarray]:
+        """Embed the query, serving repeated questions from the cache"""
+        cache_key = (settings.embedding_model, normalize_query(query))
+        query_embedding = query_embedding_cache.get(cache_key)
+        if query_embedding is not None:
+            return query_embedding
 
         try:
-            response = self.client.embeddings.create(
-                model=settings.embedding_model, input=query
+            response = await self.async_client.embeddings.create(
+                model=settings.embedding_model,
+                input=query,
+                timeout=settings.query_embedding_timeout_s,
             )
-            query_embedding = response.data[0].embedding
+            query_embedding = np.asarray(response.data[0].embedding, dtype=np.float32)
 
             # Track token usage for query embedding
             if hasattr(response, "usage") and response.usage:
-                token_tracker.track_embedding_usage(response.usage)
+                token_tracker.track_embedding_usage(
+                    response.usage, chat_id=chat_id, document_id=self.document_id
+                )
 
         except Exception as e:
             logger.error(f"Failed to generate query embedding: {e}")
+            return None
+
+        query_embedding_cache.set(cache_key, query_embedding)
+        return query_embedding
+
+    async def _find_relevant_chunks(
+        self,
+        query: str,
+        top_k: int = None,
+        chat_id: str = None,
+        timer: Optional[StageTimer] = None,
+    ) -> List[RelevantChunk]:
+        """Find most relevant chunks for the query using settings.retrieval_mode"""
+        top_k = top_k or settings.top_k_chunks
+        mode = settings.retrieval_mode
+        timer = timer or StageTimer(CHAT_STAGE_SECONDS)
+
+        if mode == "bm25":
+            return self._keyword_search(query, top_k, timer)
+        if mode != "hybrid":
+            return await self._vector_search(query, top_k, chat_id, timer)
+
+        # Reciprocal-rank fusion: BM25 and cosine scores are not comparable,
+        # so each list contributes 1 / (k + rank) per chunk instead
+        candidates = max(top_k, settings.hybrid_candidates)
+        fused: Dict[int, float] = {}
+        chunks_by_index: Dict[int, DocumentChunk] = {}
+        for ranked in (
+            await self._vector_search(query, candidates, chat_id, timer),
+            self._keyword_search(query, candidates, timer),
+        ):
+            for rank, relevant in enumerate(ranked):
+                index = relevant.chunk.chunk_index
+                chunks_by_index[index] = relevant.chunk
+                fused[index] = fused.get(index, 0.0) + 1 / (
+                    settings.hybrid_rrf_k + rank + 1
+                )
+
+        best = sorted(fused, key=fused.get, reverse=True)[:top_k]
+        return [
+            RelevantChunk(chunk=chunks_by_index[index], similarity_score=fused[index])
+            for index in best
+        ]
+
+    def _keyword_search(
+        self, query: str, top_k: int, timer: StageTimer
+    ) -> List[RelevantChunk]:
+        """BM25 search; runs locally without embedding the query"""
+        # Chunks that are created but not yet indexed are not searchable
+        with timer.stage("search"):
+            positions, scores = self.bm25_index.search(
+                query, top_k, max_chunk_index=len(self.chunks)
+            )
+        return [
+            RelevantChunk(chunk=self.chunks[position], similarity_score=float(score))
+            for position, score in zip(positions, scores)
+        ]
+
+    async def _vector_search(
+        self, query: str, top_k: int, chat_id: str, timer: StageTimer
+    ) -> List[RelevantChunk]:
+        """Cosine search over the embedding index"""
+        with timer.stage("embed_query"):
+            query_embedding = await self._embed_query(query, chat_id)
+        if query_embedding is None:
             return []
 
-        similarities = []
-        for chunk_embedding in self.chunk_embeddings:
-            if chunk_embedding:
-                similarity = self._cosine_similarity(query_embedding, chunk_embedding)
-                similarities.append(similarity)
+        # Get top-k most similar chunks; ingestion may still be appending rows,
+        # so read the matrix and row ids as one snapshot
+        index = self._index
+        # Documents stored with fewer dimensions compare on the query's prefix
+        query_embedding = query_embedding[: index.matrix.shape[1]]
+        with timer.stage("search"):
+            if index.ann_index is not None:
+                top_rows, top_scores = index.ann_index.search(
+                    index.matrix, query_embedding, top_k, scales=index.scales
+                )
             else:
-                similarities.append(0.0)
-
-        # Get top-k most similar chunks
-        top_indices = np.argsort(similarities)[::-1][:top_k]
+                top_rows, top_scores = top_k_similar(
+                    index.matrix, query_embedding, top_k, scales=index.scales
+                )
 
         relevant_chunks = []
-        for idx in top_indices:
-            if similarities[idx] > settings.similarity_threshold:
+        for row, similarity in zip(top_rows, top_scores):
+            if similarity > settings.similarity_threshold:
                 relevant_chunks.append(
                     RelevantChunk(
-                        chunk=self.chunks[idx], similarity_score=similarities[idx]
+                        chunk=self.chunks[index.row_ids[row]],
+                        similarity_score=float(similarity),
                     )
                 )
 
         return relevant_chunks
 
-    def chat_stream(self, query: str, message_history: List = None):
-        """Process query and return streaming response with context and conversation history"""
+    async def chat_stream(
+        self,
+        query: str,
+        message_history: List = None,
+        summary: str = None,
+        chat_id: str = None,
+        timer: Optional[StageTimer] = None,
+    ):
+        """
+        Process query and return streaming response with context and conversation
+        history. `summary` stands in for turns older than message_history;
+        `chat_id` attributes token usage to the chat. Stage timings are added
+        to `timer`, which the caller finishes.
+        """
         if not self.is_ready:
             yield {"error": "Context provider not initialized", "success": False}
             return
+        timer = timer or StageTimer(CHAT_STAGE_SECONDS)
 
         # Find relevant chunks
-        relevant_chunks = self._find_relevant_chunks(query)
-
-        # Build context
-        context = "\n\n".join(
-            [
-                f"{chunk.chunk.content}"
-                for chunk in relevant_chunks
-            ]
+        relevant_chunks = await self._find_relevant_chunks(
+            query, chat_id=chat_id, timer=timer
         )
 
-        # Build conversation history
-        conversation_history = ""
-        if message_history and len(message_history) > 1:
-            # Get the last 10 messages to avoid making the prompt too long
-            recent_messages = message_history[-10:]
-            history_parts = []
-            for msg in recent_messages[:-1]:  # Exclude the current message
-                role = "User" if msg.get("role") == "human" else "Assistant"
-                content = msg.get("message", msg.get("content", ""))
-                if content.strip():
-                    history_parts.append(f"{role}: {content}")
-
-            if history_parts:
-                conversation_history = f"""
-
-CONVERSATION HISTORY:
-{chr(10).join(history_parts)}
-"""
-
-        # Create enhanced prompt with history
-        prompt = f"""
-You are an intelligent assistant trained on the following PDF content. Answer the user's question based **only** on the context provided below.
-
-If the question isn't related to the context or there's not enough information to answer it meaningfully, respond politely and conversationally — don't guess or make up facts. It's okay to be a bit playful or redirect the user to ask something relevant.
-
-Use the conversation history to understand the context of the current question and provide more relevant, coherent responses.
-
-CONTEXT:
-{context}{conversation_history}
-
-CURRENT QUESTION: {query}
-
-Your response:
-"""
+        # Fit instructions, context and history into the prompt token budget
+        with timer.stage("prompt_build"):
+            assembled = build_prompt(
+                query, relevant_chunks, message_history, self.model, summary=summary
+            )
+        prompt = assembled.prompt
+        metadata = {
+            "type": "metadata",
+            "document_id": self.document_id,
+            **assembled.metadata(),
+            "success": True,
+        }
+
+        # Same document, retrieved chunks, question and history give the
+        # same answer at our low temperature, so it can be replayed
+        cache_key = (
+            self.document_id,
+            self.model,
+            tuple(chunk.chunk.chunk_index for chunk in assembled.chunks),
+            normalize_query(query),
+            hashlib.sha256(
+                "\n".join(
+                    [summary if assembled.summary_used else "", *assembled.history_parts]
+                ).encode("utf-8")
+            ).hexdigest(),
+        )
+        cached_answer = answer_cache.get(cache_key)
+        if cached_answer is not None:
+            async for event in self._replay_answer(cached_answer, metadata, chat_id):
+                yield event
+            return
 
         try:
             # First, send metadata about the context
-            yield {
-                "type": "metadata",
-                "chunks_used": len(relevant_chunks),
-                "success": True,
-            }
+            yield metadata
 
             # Stream the response and accumulate content
             accumulated_content = ""
-            stream = self.client.chat.completions.create(
+            request_start = time.perf_counter()
+            first_token_at = None
+            stream = await self.async_client.chat.completions.create(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=settings.openai_max_tokens,
@@ -198,12 +678,15 @@ Your response:
                 stream_options={"include_usage": True},  # Include usage in streaming
             )
 
-            for chunk in stream:
+            async for chunk in stream:
                 if (
                     len(chunk.choices) > 0
                     and chunk.choices[0].delta.content is not None
                 ):
                     content_chunk = chunk.choices[0].delta.content
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                        timer.add("first_token", first_token_at - request_start)
                     accumulated_content += content_chunk
                     yield {
                         "type": "content",
@@ -213,7 +696,14 @@ Your response:
                 
                 # Track usage when available (usually in the last chunk)
                 if hasattr(chunk, "usage") and chunk.usage:
-                    token_tracker.track_chat_usage(chunk.usage, self.model)
+                    token_tracker.track_chat_usage(
+                        chunk.usage, self.model, chat_id, self.document_id
+                    )
+
+            if first_token_at is not None:
+                timer.add("stream", time.perf_counter() - first_token_at)
+            if accumulated_content:
+                answer_cache.set(cache_key, accumulated_content)
 
             # Send completion signal with accumulated content
             yield {
@@ -229,3 +719,11 @@ Your response:
                 "error": "Failed to generate response",
                 "success": False,
             }
+
+    async def _replay_answer(self, answer: str, metadata: Dict, chat_id: str = None):
+        """Stream a cached answer using the same events as a live response"""
+        token_tracker.track_cache_hit(self.model, chat_id, self.document_id)
+        logger.info("♻️ Serving answer from cache")
+        yield {**metadata, "cached": True}
+        yield {"type": "content", "content": answer, "success": True}
+        yield {"type": "done", "success": True, "accumulated_content": answer}
@@ -0,0 +1,184 @@
+"""
+Rolling conversation summaries
+Folds chat turns that have scrolled out of the prompt's history window into
+a per-chat running summary, updated in the background after each answer
+"""
+
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from openai import AsyncOpenAI
+
+from config import settings
+from services.message_store import HUMAN, MessageStore, StoredMessage
+from services.openai_clients import openai_clients
+from services.token_tracker import token_tracker
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """
+You maintain a running summary of a conversation between a user and an assistant about a PDF document.
+
+Update the summary below with the new messages. Keep facts, names, numbers and open questions the user may refer back to; drop greetings and repetition. Write at most {max_words} words of plain prose.
+
+CURRENT SUMMARY:
+{summary}
+
+NEW MESSAGES:
+{messages}
+
+Updated summary:
+"""
+
+
+@dataclass
+class ConversationSummary:
+    """Running summary of a chat's older messages"""
+
+    chat_id: str
+    text: str = ""
+    summarized_through_id: int = 0  # Last message id folded into the summary
+    updated_at: datetime = field(default_factory=datetime.now)
+
+
+class ConversationMemory:
+    """
+    Per-chat summaries of messages older than the history window.
+
+    `refresh` only schedules work: the summary is updated by a background
+    task, at most one per chat, so answers never wait for it.
+    """
+
+    def __init__(
+        self,
+        message_store: MessageStore,
+        history_messages: int,
+        max_chats: int = None,
+    ):
+        self.message_store = message_store
+        self.history_messages = history_messages
+        self.max_chats = max_chats or settings.summary_max_chats
+        self.model = settings.summary_model or settings.openai_model
+        self._summaries: "OrderedDict[str, ConversationSummary]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._cleared: Set[str] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        return openai_clients.async_client
+
+    def get(self, chat_id: str) -> Optional[ConversationSummary]:
+        with self._lock:
+            summary = self._summaries.get(chat_id)
+            if summary is not None:
+                self._summaries.move_to_end(chat_id)
+            return summary
+
+    def refresh(self, chat_id: str) -> None:
+        """Schedule a summary update for a chat unless one is already running"""
+        if not settings.summary_enabled or chat_id in self._tasks:
+            return
+        self._cleared.discard(chat_id)
+        task = asyncio.create_task(self._update(chat_id))
+        self._tasks[chat_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(chat_id, None))
+
+    def clear(self, chat_id: str) -> None:
+        with self._lock:
+            self._summaries.pop(chat_id, None)
+        # A running update must not write back the old conversation
+        self._cleared.add(chat_id)
+
+    async def close(self) -> None:
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    async def _update(self, chat_id: str) -> None:
+        try:
+            # Catch up in bounded steps; a long chat seen for the first time
+            # (e.g. after a restart) may have many unsummarized messages
+            while True:
+                pending = await asyncio.to_thread(self._unsummarized, chat_id)
+                if len(pending) < settings.summary_min_messages:
+                    return
+                batch = pending[: settings.summary_batch_messages]
+                summary = self.get(chat_id) or ConversationSummary(chat_id=chat_id)
+                text = await self._summarize(summary.text, batch)
+                if chat_id in self._cleared:
+                    return
+                self._store(
+                    ConversationSummary(
+                        chat_id=chat_id,
+                        text=text,
+                        summarized_through_id=int(batch[-1].id),
+                    )
+                )
+                logger.info(
+                    f"📝 Folded {len(batch)} messages into the summary of chat {chat_id}"
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to update summary for chat {chat_id}: {e}")
+
+    def _unsummarized(self, chat_id: str) -> List[StoredMessage]:
+        """Messages older than the history window that the summary lacks"""
+        window = self.message_store.recent(chat_id, self.history_messages)
+        if len(window) < self.history_messages:
+            return []
+        summary = self.get(chat_id)
+        cursor = str(summary.summarized_through_id) if summary else None
+        window_start = int(window[0].id)
+        pending, _ = self.message_store.page(
+            chat_id, cursor, settings.summary_batch_messages
+        )
+        return [message for message in pending if int(message.id) < window_start]
+
+    async def _summarize(self, summary: str, messages: List[StoredMessage]) -> str:
+        transcript = "\n".join(
+            f"{'User' if message.role == HUMAN else 'Assistant'}: {message.message}"
+            for message in messages
+        )
+        # Leave headroom over the word limit so the summary is not cut off
+        max_words = int(settings.summary_max_tokens * 0.6)
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {
+                    "role": "user",
+                    "content": SUMMARY_PROMPT.format(
+                        max_words=max_words,
+                        summary=summary or "(empty)",
+                        messages=transcript,
+                    ),
+                }
+            ],
+            max_tokens=settings.summary_max_tokens,
+            temperature=0,
+        )
+        token_tracker.track_summary_usage(
+            response.usage, self.model, chat_id=messages[0].chat_id
+        )
+        return (response.choices[0].message.content or "").strip()
+
+    def _store(self, summary: ConversationSummary) -> None:
+        with self._lock:
+            self._summaries[summary.chat_id] = summary
+            self._summaries.move_to_end(summary.chat_id)
+            while len(self._summaries) > self.max_chats:
+                self._summaries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": settings.summary_enabled,
+                "chats_summarized": len(self._summaries),
+                "updates_running": len(self._tasks),
+            }
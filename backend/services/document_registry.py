@@ -0,0 +1,344 @@
+"""
+Document registry
+Keeps one index per uploaded document, keyed by content hash. Indexes are
+persisted to disk as versioned snapshots, kept resident in least-recently-used
+order within a memory budget and reloaded lazily when evicted or after a
+restart.
+"""
+
+import json
+import logging
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+from services.ann_index import IVFIndex
+from services.bm25_index import BM25Index
+from services.context_provider import ContextProvider
+from services.embedding_storage import load_embeddings, save_embeddings
+from services.pdf_processor import DocumentChunk
+
+logger = logging.getLogger(__name__)
+
+# Bump when the snapshot layout or BM25 tokenization changes; older
+# snapshots are then ignored
+SNAPSHOT_VERSION = 2
+
+
+def snapshot_fingerprint() -> Dict:
+    """Settings a snapshot's vectors depend on; queries must be embedded alike"""
+    return {
+        "embedding_model": settings.embedding_model,
+        "embedding_dimensions": settings.embedding_dimensions,
+    }
+
+
+@dataclass
+class DocumentInfo:
+    """Metadata kept for every registered document, resident or not"""
+
+    document_id: str
+    filename: str
+    chunks_count: int
+    memory_bytes: int
+    failed_embeddings: int = 0  # Chunks left without a vector, retried on re-upload
+    status: str = "ready"  # indexing, ready
+    percent_indexed: float = 100.0
+    created_at: datetime = field(default_factory=datetime.now)
+
+    def to_dict(self) -> Dict:
+        return {
+            "document_id": self.document_id,
+            "filename": self.filename,
+            "status": self.status,
+            "chunks_count": self.chunks_count,
+            "failed_embeddings": self.failed_embeddings,
+            "percent_indexed": self.percent_indexed,
+            "memory_mb": round(self.memory_bytes / (1024 * 1024), 2),
+            "created_at": self.created_at.isoformat(),
+        }
+
+
+class DocumentRegistry:
+    """Thread-safe registry of document indexes with LRU eviction"""
+
+    def __init__(self, store_dir: str = None, memory_budget_mb: int = None):
+        self.store_dir = Path(store_dir or settings.document_store_dir)
+        if memory_budget_mb is None:
+            memory_budget_mb = settings.document_memory_budget_mb
+        self.memory_budget_bytes = memory_budget_mb * 1024 * 1024
+        self._documents: Dict[str, DocumentInfo] = {}
+        self._resident: "OrderedDict[str, ContextProvider]" = OrderedDict()
+        # Heap bytes charged per resident document, measured when it became
+        # resident; memory-mapped arrays of a loaded snapshot are not charged
+        self._resident_charges: Dict[str, int] = {}
+        self._resident_bytes = 0
+        # Documents still being ingested, searchable but not yet persisted
+        self._indexing: Dict[str, Tuple[ContextProvider, str]] = {}
+        self._active_document_id: Optional[str] = None
+        # Active document to restore if the indexing one fails
+        self._previous_active_id: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def active_document_id(self) -> Optional[str]:
+        """The most recently uploaded document, used when none is selected"""
+        return self._active_document_id
+
+    def __contains__(self, document_id: str) -> bool:
+        return document_id in self._documents
+
+    def begin(self, provider: ContextProvider, filename: str) -> None:
+        """Serve a partially indexed document and make it active"""
+        with self._lock:
+            self._indexing[provider.document_id] = (provider, filename)
+            self._previous_active_id.setdefault(provider.document_id, self._active_document_id)
+            self._active_document_id = provider.document_id
+        logger.info(f"⏳ Serving document {provider.document_id} while indexing")
+
+    def abort(self, document_id: str) -> None:
+        """Drop a document whose ingestion failed and restore the previous default"""
+        with self._lock:
+            if self._indexing.pop(document_id, None) is None:
+                return
+            previous_id = self._previous_active_id.pop(document_id, None)
+            if self._active_document_id == document_id:
+                self._active_document_id = previous_id
+
+    def register(self, provider: ContextProvider, filename: str) -> DocumentInfo:
+        """Persist a freshly built index and make it resident and active"""
+        document_id = provider.document_id
+        self._save(provider, filename)
+        # The extracted PDF text is no longer needed once the index exists
+        provider.pdf_processor = None
+
+        info = DocumentInfo(
+            document_id=document_id,
+            filename=filename,
+            chunks_count=len(provider.chunks),
+            memory_bytes=provider.memory_bytes(),
+            failed_embeddings=provider.failed_embeddings,
+        )
+        with self._lock:
+            self._documents[document_id] = info
+            self._make_resident(document_id, provider, info.memory_bytes)
+            if self._indexing.pop(document_id, None) is None:
+                self._active_document_id = document_id
+            # Otherwise begin() already made it active; keep any later choice
+            self._previous_active_id.pop(document_id, None)
+        logger.info(f"📚 Registered document {document_id} ({filename})")
+        return info
+
+    def load_snapshots(self) -> int:
+        """
+        Register every compatible snapshot on disk without loading its
+        arrays, which happens on first use. The newest becomes active.
+        """
+        if not self.store_dir.is_dir():
+            return 0
+        fingerprint = snapshot_fingerprint()
+        loaded = []
+        for directory in sorted(self.store_dir.iterdir()):
+            if not directory.is_dir():
+                continue
+            if directory.name.endswith(".tmp"):
+                # Left over from a save interrupted by a crash
+                shutil.rmtree(directory, ignore_errors=True)
+                continue
+            try:
+                with open(directory / "manifest.json", encoding="utf-8") as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                logger.warning(f"Skipping {directory.name}: no readable snapshot manifest")
+                continue
+            if manifest.get("version") != SNAPSHOT_VERSION:
+                logger.warning(f"Skipping {directory.name}: snapshot version {manifest.get('version')}")
+                continue
+            if manifest.get("fingerprint") != fingerprint:
+                logger.warning(
+                    f"Skipping {directory.name}: built with {manifest.get('fingerprint')}, "
+                    f"current settings are {fingerprint}"
+                )
+                continue
+            loaded.append(
+                DocumentInfo(
+                    document_id=directory.name,
+                    filename=manifest["filename"],
+                    chunks_count=manifest["chunks_count"],
+                    memory_bytes=manifest["memory_bytes"],
+                    failed_embeddings=manifest.get("failed_embeddings", 0),
+                    created_at=datetime.fromisoformat(manifest["created_at"]),
+                )
+            )
+
+        loaded.sort(key=lambda info: info.created_at)
+        with self._lock:
+            for info in loaded:
+                self._documents.setdefault(info.document_id, info)
+            if loaded and self._active_document_id is None:
+                self._active_document_id = loaded[-1].document_id
+        if loaded:
+            logger.info(f"📂 Found {len(loaded)} document snapshots in {self.store_dir}")
+        return len(loaded)
+
+    def activate(self, document_id: str) -> None:
+        """Make an already registered document the default"""
+        with self._lock:
+            if document_id in self._documents:
+                self._active_document_id = document_id
+
+    def get(self, document_id: str = None) -> Optional[ContextProvider]:
+        """Return the index for a document, loading it from disk if evicted"""
+        document_id = document_id or self._active_document_id
+        with self._lock:
+            indexing = self._indexing.get(document_id)
+            if indexing is not None:
+                return indexing[0]
+            if document_id not in self._documents:
+                return None
+            provider = self._resident.get(document_id)
+            if provider is not None:
+                self._resident.move_to_end(document_id)
+                return provider
+
+        # Load outside the lock so other documents stay available meanwhile
+        provider = self._load(document_id)
+        memory_bytes = provider.memory_bytes()
+        with self._lock:
+            existing = self._resident.get(document_id)
+            if existing is not None:  # Another request loaded it first
+                self._resident.move_to_end(document_id)
+                return existing
+            self._make_resident(document_id, provider, memory_bytes)
+        return provider
+
+    def get_info(self, document_id: str = None) -> Optional[DocumentInfo]:
+        document_id = document_id or self._active_document_id
+        with self._lock:
+            indexing = self._indexing.get(document_id)
+            if indexing is not None:
+                return self._indexing_info(*indexing)
+            return self._documents.get(document_id)
+
+    def list_documents(self) -> List[Dict]:
+        with self._lock:
+            documents = [
+                {**info.to_dict(), "resident": document_id in self._resident}
+                for document_id, info in self._documents.items()
+            ]
+            documents += [
+                {**self._indexing_info(*indexing).to_dict(), "resident": True}
+                for indexing in self._indexing.values()
+            ]
+            return documents
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "documents_count": len(self._documents),
+                "resident_count": len(self._resident),
+                "resident_mb": round(self._resident_bytes / (1024 * 1024), 2),
+                "memory_budget_mb": round(self.memory_budget_bytes / (1024 * 1024), 2),
+            }
+
+    @staticmethod
+    def _indexing_info(provider: ContextProvider, filename: str) -> DocumentInfo:
+        return DocumentInfo(
+            document_id=provider.document_id,
+            filename=filename,
+            chunks_count=len(provider.chunks),
+            memory_bytes=provider.memory_bytes(),
+            status="indexing",
+            percent_indexed=provider.percent_indexed,
+        )
+
+    def _make_resident(
+        self, document_id: str, provider: ContextProvider, memory_bytes: int
+    ) -> None:
+        """Insert as most recently used and evict others over budget (lock held)"""
+        self._resident_bytes -= self._resident_charges.pop(document_id, 0)
+        self._resident[document_id] = provider
+        self._resident.move_to_end(document_id)
+        self._resident_charges[document_id] = memory_bytes
+        self._resident_bytes += memory_bytes
+
+        # Never evict the document that was just requested
+        while self._resident_bytes > self.memory_budget_bytes and len(self._resident) > 1:
+            evicted_id, _ = self._resident.popitem(last=False)
+            self._resident_bytes -= self._resident_charges.pop(evicted_id)
+            logger.info(f"♻️ Evicted document {evicted_id} from memory")
+
+    def _document_dir(self, document_id: str) -> Path:
+        return self.store_dir / document_id
+
+    def _save(self, provider: ContextProvider, filename: str) -> None:
+        """Write a snapshot; manifest.json is what load_snapshots() reads"""
+        directory = self._document_dir(provider.document_id)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        # A private temp dir per save, so concurrent saves never share files
+        tmp_dir = Path(
+            tempfile.mkdtemp(prefix=f"{directory.name}.", suffix=".tmp", dir=self.store_dir)
+        )
+
+        with open(tmp_dir / "chunks.json", "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "filename": filename,
+                    "chunks": [chunk.to_dict() for chunk in provider.chunks],
+                },
+                f,
+            )
+        save_embeddings(tmp_dir, provider.embedding_matrix, provider.embedding_scales)
+        np.save(tmp_dir / "row_ids.npy", provider.embedding_row_ids)
+        if provider.ann_index is not None:
+            provider.ann_index.save(tmp_dir)
+        provider.bm25_index.save(tmp_dir)
+        with open(tmp_dir / "manifest.json", "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": SNAPSHOT_VERSION,
+                    "fingerprint": snapshot_fingerprint(),
+                    "filename": filename,
+                    "chunks_count": len(provider.chunks),
+                    "memory_bytes": provider.memory_bytes(),
+                    "failed_embeddings": provider.failed_embeddings,
+                    "created_at": datetime.now().isoformat(),
+                },
+                f,
+            )
+
+        # Replace any previous copy in one step so readers never see a partial index
+        shutil.rmtree(directory, ignore_errors=True)
+        try:
+            tmp_dir.rename(directory)
+        except OSError:
+            # Another save of the same content landed first; keep that one
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not directory.is_dir():
+                raise
+
+    def _load(self, document_id: str) -> ContextProvider:
+        directory = self._document_dir(document_id)
+        logger.info(f"📂 Loading document {document_id} from {directory}")
+        with open(directory / "chunks.json", encoding="utf-8") as f:
+            data = json.load(f)
+        embedding_matrix, embedding_scales = load_embeddings(
+            directory, mmap=settings.embedding_mmap
+        )
+        return ContextProvider.from_index(
+            document_id=document_id,
+            chunks=[DocumentChunk(**chunk) for chunk in data["chunks"]],
+            embedding_matrix=embedding_matrix,
+            embedding_row_ids=np.load(directory / "row_ids.npy"),
+            ann_index=IVFIndex.load(directory),
+            bm25_index=BM25Index.load(directory),
+            embedding_scales=embedding_scales,
+        )
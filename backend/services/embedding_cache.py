@@ -0,0 +1,98 @@
+"""
+Persistent embedding cache
+Stores chunk embeddings on disk keyed by (embedding model, SHA-256 of text)
+so re-uploaded or revised documents only embed the chunks that changed
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def text_digest(text: str) -> str:
+    """Content hash used as the cache key for a chunk"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """SQLite-backed embedding store shared by all uploads in the process"""
+
+    def __init__(self, db_path: str):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, digest)
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.commit()
+        logger.info(f"🗄️ Embedding cache opened at {self.db_path}")
+
+    def get_many(self, model: str, digests: List[str]) -> Dict[str, List[float]]:
+        """Return cached embeddings for the given digests, skipping misses"""
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(digests))
+        # Stay well below SQLite's bound-parameter limit
+        for i in range(0, len(unique), 500):
+            batch = unique[i : i + 500]
+            placeholders = ",".join("?" * len(batch))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT digest, vector FROM embeddings "
+                    f"WHERE model = ? AND digest IN ({placeholders})",
+                    [model, *batch],
+                ).fetchall()
+            for digest, blob in rows:
+                found[digest] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, model: str, items: Dict[str, List[float]]) -> None:
+        """Store embeddings keyed by digest"""
+        rows = [
+            (model, digest, np.asarray(vector, dtype=np.float32).tobytes())
+            for digest, vector in items.items()
+            if vector
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, digest, vector) "
+                "VALUES (?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Return the process-wide embedding cache, or None when disabled"""
+    global _embedding_cache
+
+    if not settings.embedding_cache_enabled:
+        return None
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            _embedding_cache = EmbeddingCache(settings.embedding_cache_path)
+        return _embedding_cache
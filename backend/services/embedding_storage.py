@@ -0,0 +1,92 @@
+"""
+Compact embedding storage
+Stores normalized embeddings as float32, float16 or int8 with a per-row
+scale, optionally truncated to fewer dimensions, and scores queries
+directly on the stored arrays, which may be memory-mapped from disk
+"""
+
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+STORAGE_DTYPES = ("float32", "float16", "int8")
+
+# Rows upcast to float32 at a time when scoring compact arrays; small blocks
+# stay in cache, which keeps int8 scoring as fast as float32
+SCORE_BLOCK_ROWS = 1024
+
+
+def truncate_dimensions(matrix: np.ndarray, dimensions: int) -> np.ndarray:
+    """
+    Keep the first `dimensions` components and re-normalize. Only
+    meaningful for models trained for it, such as text-embedding-3.
+    """
+    if not dimensions or dimensions >= matrix.shape[1]:
+        return matrix
+    truncated = np.ascontiguousarray(matrix[:, :dimensions], dtype=np.float32)
+    norms = np.linalg.norm(truncated, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return truncated / norms
+
+
+def quantize(matrix: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Convert float32 rows to the storage dtype. int8 rows are scaled to use
+    the full [-127, 127] range and the per-row scale is returned alongside.
+    """
+    if dtype == "float32":
+        return np.ascontiguousarray(matrix, dtype=np.float32), None
+    if dtype == "float16":
+        return matrix.astype(np.float16), None
+    if dtype == "int8":
+        peaks = np.abs(matrix).max(axis=1)
+        peaks[peaks == 0] = 1
+        scales = (peaks / 127).astype(np.float32)
+        data = np.rint(matrix / scales[:, None]).astype(np.int8)
+        return data, scales
+    raise ValueError(f"Unknown embedding storage dtype: {dtype}")
+
+
+def score(
+    matrix: np.ndarray, query: np.ndarray, scales: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Dot product of every stored row with a float32 query"""
+    if matrix.dtype == np.float32:
+        return matrix @ query
+    scores = np.empty(len(matrix), dtype=np.float32)
+    for start in range(0, len(matrix), SCORE_BLOCK_ROWS):
+        block = matrix[start : start + SCORE_BLOCK_ROWS]
+        scores[start : start + len(block)] = block.astype(np.float32) @ query
+    if scales is not None:
+        scores *= scales
+    return scores
+
+
+def save_embeddings(
+    directory: Path, matrix: np.ndarray, scales: Optional[np.ndarray]
+) -> None:
+    np.save(directory / "embeddings.npy", matrix)
+    if scales is not None:
+        np.save(directory / "scales.npy", scales)
+
+
+def load_embeddings(
+    directory: Path, mmap: bool = True
+) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Open saved embeddings. Memory-mapped arrays live in the OS page cache,
+    which every process serving the same document shares.
+    """
+    mmap_mode = "r" if mmap else None
+    matrix = np.load(directory / "embeddings.npy", mmap_mode=mmap_mode)
+    scales_path = directory / "scales.npy"
+    scales = np.load(scales_path) if scales_path.exists() else None
+    return matrix, scales
+
+
+def resident_bytes(array: Optional[np.ndarray]) -> int:
+    """Heap memory used by an array; memory-mapped pages are not counted"""
+    if array is None or isinstance(array, np.memmap):
+        return 0
+    return array.nbytes
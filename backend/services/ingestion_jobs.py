@@ -0,0 +1,207 @@
+"""
+Background PDF ingestion jobs
+Runs PDF processing and embedding on a worker pool and publishes progress
+to any number of async subscribers
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Minimum time between progress notifications for the same job
+PUBLISH_INTERVAL_S = 0.1
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+@dataclass
+class IngestionJob:
+    """State of a single PDF ingestion"""
+
+    job_id: str
+    filename: str
+    pdf_path: str
+    document_id: Optional[str] = None
+    status: str = "queued"  # queued, running, completed, failed
+    progress: Dict = field(default_factory=dict)
+    result: Optional[Dict] = None
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.now)
+    finished_at: Optional[datetime] = None
+
+    def __post_init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = []
+        self._last_publish = 0.0
+        self._cancelled = threading.Event()
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    @property
+    def is_cancelled(self) -> bool:
+        """Set on shutdown; the worker stops at its next checkpoint"""
+        return self._cancelled.is_set()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "job_id": self.job_id,
+                "filename": self.filename,
+                "document_id": self.document_id,
+                "status": self.status,
+                "progress": dict(self.progress),
+                "result": self.result,
+                "error": self.error,
+                "created_at": self.created_at.isoformat(),
+                "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            }
+
+    def update_progress(self, **progress) -> None:
+        """Record progress from the worker thread, throttling notifications"""
+        with self._lock:
+            self.progress.update(progress)
+        now = time.monotonic()
+        if now - self._last_publish >= PUBLISH_INTERVAL_S:
+            self._last_publish = now
+            self._publish()
+
+    def set_status(self, status: str, result: Dict = None, error: str = None) -> None:
+        with self._lock:
+            self.status = status
+            self.result = result
+            self.error = error
+            if status in TERMINAL_STATUSES:
+                self.finished_at = datetime.now()
+        self._publish()
+
+    def subscribe(self) -> asyncio.Queue:
+        """Register the running event loop for job snapshots"""
+        queue: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers.append((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s[1] is not queue]
+
+    def _publish(self) -> None:
+        snapshot = self.to_dict()
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, snapshot)
+            except RuntimeError:  # Subscriber's loop already closed
+                self.unsubscribe(queue)
+
+
+class IngestionJobManager:
+    """Owns the ingestion worker pool and the recent job history"""
+
+    def __init__(self, max_workers: int = None, history_size: int = None):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or settings.ingestion_workers,
+            thread_name_prefix="ingestion",
+        )
+        self._history_size = history_size or settings.ingestion_job_history
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        filename: str,
+        pdf_path: str,
+        run: Callable[[IngestionJob], Dict],
+        document_id: str = None,
+    ) -> IngestionJob:
+        """
+        Queue an ingestion. `run` executes on a worker thread and returns the
+        job result; any exception it raises marks the job as failed. If the
+        same document is already queued or running, that job is returned
+        instead and nothing new is queued.
+        """
+        job = IngestionJob(
+            job_id=uuid.uuid4().hex,
+            filename=filename,
+            pdf_path=pdf_path,
+            document_id=document_id,
+        )
+        with self._lock:
+            if document_id is not None:
+                for existing in self._jobs.values():
+                    if existing.document_id == document_id and not existing.is_finished:
+                        logger.info(
+                            f"📎 Document {document_id} is already being ingested "
+                            f"by job {existing.job_id}"
+                        )
+                        return existing
+            self._jobs[job.job_id] = job
+            # Forget the oldest finished jobs beyond the history size
+            for job_id in list(self._jobs):
+                if len(self._jobs) <= self._history_size:
+                    break
+                if self._jobs[job_id].is_finished:
+                    del self._jobs[job_id]
+
+        self._executor.submit(self._run, job, run)
+        logger.info(f"📥 Queued ingestion job {job.job_id} for {filename}")
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: IngestionJob, run: Callable[[IngestionJob], Dict]) -> None:
+        job.set_status("running")
+        try:
+            result = run(job)
+        except Exception as e:
+            logger.error(f"Ingestion job {job.job_id} failed: {e}")
+            job.set_status("failed", error=str(e))
+            return
+        job.set_status("completed", result=result)
+        logger.info(f"✅ Ingestion job {job.job_id} completed")
+
+    async def events(self, job: IngestionJob) -> AsyncIterator[Dict]:
+        """Yield job snapshots until the job finishes"""
+        queue = job.subscribe()
+        try:
+            snapshot = job.to_dict()
+            yield snapshot
+            while snapshot["status"] not in TERMINAL_STATUSES:
+                snapshot = await queue.get()
+                yield snapshot
+        finally:
+            job.unsubscribe(queue)
+
+    def shutdown(self) -> None:
+        """
+        Cancel every unfinished job and wait for running ones to stop, so
+        nothing uses the OpenAI clients or the document store afterwards.
+        Blocks until then; call it off the event loop.
+        """
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if not job.is_finished]
+        for job in jobs:
+            job.cancel()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        for job in jobs:
+            if not job.is_finished:  # Never started
+                job.set_status("failed", error="Server shut down before ingestion started")
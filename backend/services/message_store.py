@@ -0,0 +1,414 @@
+"""
+Chat message store
+Persists chat messages behind a small interface with an in-memory backend
+and a durable SQLite backend, both keyed by chat so appends and history
+lookups cost the same no matter how many other chats exist
+"""
+
+import heapq
+import itertools
+import logging
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+HUMAN = "human"
+AI = "ai"
+
+# Message ids the SQLite store reserves from the database at a time
+ID_BLOCK_SIZE = 100
+
+
+@dataclass
+class StoredMessage:
+    """A single chat message"""
+
+    id: str
+    chat_id: str
+    role: str  # human, ai
+    message: str
+    timestamp: str = field(default_factory=lambda: datetime.now().isoformat())
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def _message_id(message: StoredMessage) -> int:
+    return int(message.id)
+
+
+class MessageStore(ABC):
+    """
+    Interface of a chat message backend. Ids are assigned on append, never
+    repeat and increase in insertion order; pagination cursors are ids.
+    """
+
+    @abstractmethod
+    def append(self, chat_id: str, role: str, message: str) -> StoredMessage:
+        ...
+
+    @abstractmethod
+    def recent(self, chat_id: str, limit: int) -> List[StoredMessage]:
+        """Return the last `limit` messages of a chat, oldest first"""
+        ...
+
+    @abstractmethod
+    def list(self, chat_id: str = None) -> List[StoredMessage]:
+        """Return one chat's messages, or every message, in id order"""
+        ...
+
+    @abstractmethod
+    def page(
+        self, chat_id: str = None, cursor: str = None, limit: int = 100
+    ) -> Tuple[List[StoredMessage], Optional[str]]:
+        """Return up to `limit` messages after `cursor` and the next cursor"""
+        ...
+
+    @abstractmethod
+    def clear(self, chat_id: str) -> int:
+        """Delete a chat's messages and return how many were removed"""
+        ...
+
+    @abstractmethod
+    def stats(self) -> Dict:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+def _next_cursor(messages: List[StoredMessage], limit: int) -> Optional[str]:
+    return messages[-1].id if len(messages) == limit else None
+
+
+class InMemoryMessageStore(MessageStore):
+    """Thread-safe per-chat message history, lost on restart"""
+
+    def __init__(self, max_messages_per_chat: int = None):
+        self.max_messages_per_chat = (
+            max_messages_per_chat or settings.max_messages_per_chat
+        )
+        self._chats: Dict[str, Deque[StoredMessage]] = {}
+        # Ids never repeat, even after a chat is cleared
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def append(self, chat_id: str, role: str, message: str) -> StoredMessage:
+        with self._lock:
+            message_id = next(self._ids, None)
+            if message_id is None:
+                self._ids = self._reserve_ids()
+                message_id = next(self._ids)
+            stored = StoredMessage(
+                id=str(message_id), chat_id=chat_id, role=role, message=message
+            )
+            chat = self._chats.get(chat_id)
+            if chat is None:
+                chat = self._chats[chat_id] = deque(maxlen=self.max_messages_per_chat)
+            chat.append(stored)
+        return stored
+
+    def recent(self, chat_id: str, limit: int) -> List[StoredMessage]:
+        with self._lock:
+            chat = self._chats.get(chat_id, ())
+            recent = list(itertools.islice(reversed(chat), limit))
+        recent.reverse()
+        return recent
+
+    def list(self, chat_id: str = None) -> List[StoredMessage]:
+        with self._lock:
+            if chat_id is not None:
+                return list(self._chats.get(chat_id, ()))
+            chats = [list(chat) for chat in self._chats.values()]
+        # Each chat is already in id order, so a k-way merge is enough
+        return list(heapq.merge(*chats, key=_message_id))
+
+    def page(
+        self, chat_id: str = None, cursor: str = None, limit: int = 100
+    ) -> Tuple[List[StoredMessage], Optional[str]]:
+        after = int(cursor) if cursor else 0
+        messages = self.list(chat_id)
+        messages = [m for m in messages if int(m.id) > after][:limit]
+        return messages, _next_cursor(messages, limit)
+
+    def clear(self, chat_id: str) -> int:
+        with self._lock:
+            chat = self._chats.pop(chat_id, None)
+        return len(chat) if chat else 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "chats_count": len(self._chats),
+                "messages_count": sum(len(chat) for chat in self._chats.values()),
+                "max_messages_per_chat": self.max_messages_per_chat,
+            }
+
+
+class SQLiteMessageStore(MessageStore):
+    """
+    Durable message store on SQLite in WAL mode.
+
+    Appends only queue the message; a writer thread commits queued messages
+    in batches, so request handlers never wait on disk. Reads merge the
+    queue with the database so a message is visible as soon as it is
+    appended.
+
+    Ids come in blocks from a counter row in the database, so they never
+    repeat across restarts and processes sharing the file never hand out
+    the same id. With several processes, ids increase in insertion order
+    within each process only.
+    """
+
+    def __init__(
+        self,
+        db_path: str = None,
+        batch_size: int = None,
+        flush_interval_ms: int = None,
+    ):
+        self.db_path = Path(db_path or settings.message_store_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size or settings.message_write_batch_size
+        if flush_interval_ms is None:
+            flush_interval_ms = settings.message_write_interval_ms
+        self.flush_interval_s = flush_interval_ms / 1000
+
+        # One connection per reading thread; WAL lets them run alongside the writer
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY,
+                chat_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                message TEXT NOT NULL,
+                timestamp TEXT NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS messages_chat_id ON messages (chat_id, id)"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS message_ids (next_id INTEGER NOT NULL)")
+        conn.commit()
+        # Databases from before the counter existed continue after their last id
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "INSERT INTO message_ids (next_id) "
+            "SELECT COALESCE(MAX(id), 0) + 1 FROM messages "
+            "WHERE NOT EXISTS (SELECT 1 FROM message_ids)"
+        )
+        conn.commit()
+
+        self._ids: Iterator[int] = iter(())
+        self._pending: List[StoredMessage] = []
+        self._lock = threading.Lock()  # Guards _ids and _pending
+        # Held while writing to the database, so clear() never races a batch
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._writer = threading.Thread(
+            target=self._write_loop, name="message-writer", daemon=True
+        )
+        self._writer.start()
+        logger.info(f"🗄️ Message store opened at {self.db_path}")
+
+    def append(self, chat_id: str, role: str, message: str) -> StoredMessage:
+        with self._lock:
+            message_id = next(self._ids, None)
+            if message_id is None:
+                self._ids = self._reserve_ids()
+                message_id = next(self._ids)
+            stored = StoredMessage(
+                id=str(message_id), chat_id=chat_id, role=role, message=message
+            )
+            self._pending.append(stored)
+            backlog = len(self._pending)
+        if backlog >= self.batch_size:
+            self._wakeup.set()
+        return stored
+
+    def recent(self, chat_id: str, limit: int) -> List[StoredMessage]:
+        # Snapshot the queue before reading, so a batch committed in between
+        # shows up at least once
+        pending = self._pending_for(chat_id)
+        rows = self._connection().execute(
+            "SELECT id, chat_id, role, message, timestamp FROM messages "
+            "WHERE chat_id = ? ORDER BY id DESC LIMIT ?",
+            (chat_id, limit),
+        ).fetchall()
+        return self._merge(rows, pending)[-limit:]
+
+    def list(self, chat_id: str = None) -> List[StoredMessage]:
+        pending = self._pending_for(chat_id)
+        if chat_id is None:
+            rows = self._connection().execute(
+                "SELECT id, chat_id, role, message, timestamp FROM messages ORDER BY id"
+            ).fetchall()
+        else:
+            rows = self._connection().execute(
+                "SELECT id, chat_id, role, message, timestamp FROM messages "
+                "WHERE chat_id = ? ORDER BY id",
+                (chat_id,),
+            ).fetchall()
+        return self._merge(rows, pending)
+
+    def page(
+        self, chat_id: str = None, cursor: str = None, limit: int = 100
+    ) -> Tuple[List[StoredMessage], Optional[str]]:
+        after = int(cursor) if cursor else 0
+        pending = [m for m in self._pending_for(chat_id) if int(m.id) > after]
+        if chat_id is None:
+            rows = self._connection().execute(
+                "SELECT id, chat_id, role, message, timestamp FROM messages "
+                "WHERE id > ? ORDER BY id LIMIT ?",
+                (after, limit),
+            ).fetchall()
+        else:
+            rows = self._connection().execute(
+                "SELECT id, chat_id, role, message, timestamp FROM messages "
+                "WHERE chat_id = ? AND id > ? ORDER BY id LIMIT ?",
+                (chat_id, after, limit),
+            ).fetchall()
+        messages = self._merge(rows, pending)[:limit]
+        return messages, _next_cursor(messages, limit)
+
+    def clear(self, chat_id: str) -> int:
+        with self._write_lock:
+            with self._lock:
+                kept = [m for m in self._pending if m.chat_id != chat_id]
+                cleared = len(self._pending) - len(kept)
+                self._pending = kept
+            conn = self._connection()
+            cleared += conn.execute(
+                "DELETE FROM messages WHERE chat_id = ?", (chat_id,)
+            ).rowcount
+            conn.commit()
+        return cleared
+
+    def stats(self) -> Dict:
+        conn = self._connection()
+        (messages_count,) = conn.execute("SELECT COUNT(*) FROM messages").fetchone()
+        with self._lock:
+            pending_count = len(self._pending)
+        return {
+            "backend": "sqlite",
+            "path": str(self.db_path),
+            "messages_count": messages_count + pending_count,
+            "pending_writes": pending_count,
+        }
+
+    def flush(self) -> None:
+        """Commit every queued message"""
+        with self._write_lock:
+            while True:
+                with self._lock:
+                    batch = self._pending[: self.batch_size]
+                if not batch:
+                    return
+                self._insert(batch)
+                # Appends only add to the end and clear() waits for the write
+                # lock, so the batch is still at the front of the queue
+                with self._lock:
+                    del self._pending[: len(batch)]
+
+    def close(self) -> None:
+        """Stop the writer after committing everything queued"""
+        self._closed = True
+        self._wakeup.set()
+        self._writer.join()
+
+    def _write_loop(self) -> None:
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval_s)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to write chat messages: {e}")
+        self.flush()
+
+    def _reserve_ids(self) -> Iterator[int]:
+        """Take the next block of ids from the database counter (self._lock held)"""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            (start,) = conn.execute("SELECT next_id FROM message_ids").fetchone()
+            conn.execute("UPDATE message_ids SET next_id = ?", (start + ID_BLOCK_SIZE,))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        return iter(range(start, start + ID_BLOCK_SIZE))
+
+    def _insert(self, batch: List[StoredMessage]) -> None:
+        """Write a batch; a row whose id is already taken is logged and dropped"""
+        rows = [(int(m.id), m.chat_id, m.role, m.message, m.timestamp) for m in batch]
+        sql = (
+            "INSERT INTO messages (id, chat_id, role, message, timestamp) "
+            "VALUES (?, ?, ?, ?, ?)"
+        )
+        conn = self._connection()
+        try:
+            conn.executemany(sql, rows)
+            conn.commit()
+            return
+        except sqlite3.IntegrityError:
+            conn.rollback()
+        # Find the colliding rows without losing the rest of the batch
+        for row in rows:
+            try:
+                conn.execute(sql, row)
+            except sqlite3.IntegrityError:
+                logger.error(
+                    f"Message id {row[0]} of chat {row[1]} is already taken, "
+                    f"dropping the message"
+                )
+        conn.commit()
+
+    def _pending_for(self, chat_id: Optional[str]) -> List[StoredMessage]:
+        with self._lock:
+            if chat_id is None:
+                return list(self._pending)
+            return [m for m in self._pending if m.chat_id == chat_id]
+
+    @staticmethod
+    def _merge(rows: List[tuple], pending: List[StoredMessage]) -> List[StoredMessage]:
+        """Combine database rows and queued messages in id order, without duplicates"""
+        messages = {
+            row[0]: StoredMessage(str(row[0]), row[1], row[2], row[3], row[4])
+            for row in rows
+        }
+        for message in pending:
+            messages.setdefault(int(message.id), message)
+        return [messages[message_id] for message_id in sorted(messages)]
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path))
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+
+def create_message_store() -> MessageStore:
+    """Build the message store selected by settings.message_store_backend"""
+    backend = settings.message_store_backend
+    if backend == "sqlite":
+        return SQLiteMessageStore()
+    if backend == "memory":
+        return InMemoryMessageStore()
+    raise ValueError(f"Unknown message store backend: {backend}")
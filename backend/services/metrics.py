@@ -0,0 +1,158 @@
+"""
+Latency metrics
+Fixed-bucket histograms of chat and ingestion stage timings, exposed in the
+Prometheus text format, and per-request stage timers
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Upper bounds in seconds, from sub-millisecond local work to slow uploads
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0,
+)
+
+
+class Histogram:
+    """Prometheus-style histogram with one series per value of a single label"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label: str = "stage",
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.buckets = buckets
+        # label value -> [per-bucket counts (last one is +Inf), sum of observations]
+        self._series: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, seconds: float) -> None:
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += seconds
+
+    def render(self) -> List[str]:
+        """Exposition lines, with cumulative bucket counts"""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            series = {value: (list(counts), total) for value, (counts, total) in self._series.items()}
+        for value in sorted(series):
+            counts, total = series[value]
+            label = f'{self.label}="{value}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label}}} {total}")
+            lines.append(f"{self.name}_count{{{label}}} {cumulative}")
+        return lines
+
+
+CHAT_STAGE_SECONDS = Histogram(
+    "chat_stage_seconds",
+    "Time spent in each stage of a chat request",
+)
+INGESTION_STAGE_SECONDS = Histogram(
+    "ingestion_stage_seconds",
+    "Time spent in each stage of document ingestion",
+)
+HISTOGRAMS = (CHAT_STAGE_SECONDS, INGESTION_STAGE_SECONDS)
+
+# Other modules' metrics, each a function returning exposition lines
+_collectors: List[Callable[[], List[str]]] = []
+
+
+def register_collector(collector: Callable[[], List[str]]) -> None:
+    _collectors.append(collector)
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    for collector in _collectors:
+        lines.extend(collector())
+    return "\n".join(lines) + "\n"
+
+
+class StageTimer:
+    """
+    Accumulates the time one request (or ingestion run) spends per stage.
+    Nothing is recorded in the histogram until finish(), so a stage entered
+    many times, such as chunking each page, is observed once with its total.
+    """
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self._marks: Dict[str, float] = {}
+        self._finished = False
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def mark(self, name: str) -> None:
+        """Remember the current time, for stages that span two call sites"""
+        self._marks.setdefault(name, time.perf_counter())
+
+    def since(self, name: str) -> Optional[float]:
+        """Seconds since mark(name), or None if it was never marked"""
+        marked = self._marks.get(name)
+        return None if marked is None else time.perf_counter() - marked
+
+    def breakdown_ms(self) -> Dict[str, float]:
+        """Stage timings so far in milliseconds, plus the total elapsed"""
+        timings = {name: round(seconds * 1000, 2) for name, seconds in self.stages.items()}
+        timings["total"] = round((time.perf_counter() - self.started) * 1000, 2)
+        return timings
+
+    def finish(self) -> None:
+        """Record every stage and the total in the histogram, once"""
+        if self._finished:
+            return
+        self._finished = True
+        for name, seconds in self.stages.items():
+            self.histogram.observe(name, seconds)
+        self.histogram.observe("total", time.perf_counter() - self.started)
+
+
+def timed_iter(iterable: Iterable, timer: StageTimer, stage: str) -> Iterator:
+    """Yield from `iterable`, adding the time spent producing each item to `stage`"""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            timer.add(stage, time.perf_counter() - start)
+        yield item
@@ -0,0 +1,231 @@
+"""
+Shared OpenAI clients
+One pooled sync client (ingestion threads) and one async client (request
+path) for the whole application, with connection reuse counters
+"""
+
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+from config import settings
+from services.metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ConnectionStats:
+    """Requests sent by one client and the connections opened for them"""
+
+    requests: int = 0
+    connections_opened: int = 0
+    tls_handshakes: int = 0
+
+    def to_dict(self) -> Dict:
+        reused = max(0, self.requests - self.connections_opened)
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "tls_handshakes": self.tls_handshakes,
+            "reuse_rate": round(reused / self.requests, 4) if self.requests else 0.0,
+        }
+
+
+def _http2_enabled() -> bool:
+    if not settings.openai_http2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("OPENAI_HTTP2 is set but h2 is not installed, using HTTP/1.1")
+        return False
+    return True
+
+
+async def _close_quietly(client: AsyncOpenAI) -> None:
+    """
+    Close a client whose event loop has already been closed. The pool still
+    drops its connections, but their transports cannot be closed on a dead
+    loop and raise; their sockets are released once they are unreferenced.
+    """
+    try:
+        await client.close()
+    except RuntimeError as e:
+        logger.debug(f"Closed stale OpenAI client with errors: {e}")
+
+
+class OpenAIClients:
+    """
+    Application-scoped OpenAI clients. They are created on first use, or
+    eagerly by open() in the app lifespan, and closed by close(). After
+    close() no new clients are built until open() is called again.
+
+    An httpx async pool is bound to the event loop it first ran on, so the
+    async client is recreated if it is used from a different loop (only
+    happens outside the server, e.g. in benchmarks calling asyncio.run).
+    The replaced client is closed so its pooled connections do not leak.
+    """
+
+    def __init__(self):
+        self._sync: Optional[OpenAI] = None
+        self._async: Optional[AsyncOpenAI] = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        # Pending closes of replaced async clients, referenced until done
+        self._closing: Set[asyncio.Future] = set()
+        self._closed = False
+        self._lock = threading.Lock()
+        # Sync requests come from several ingestion threads at once
+        self._stats_lock = threading.Lock()
+        self.stats = {"sync": ConnectionStats(), "async": ConnectionStats()}
+
+    def _http_options(self) -> Dict:
+        return {
+            "limits": httpx.Limits(
+                max_connections=settings.openai_max_connections,
+                max_keepalive_connections=settings.openai_max_keepalive_connections,
+                keepalive_expiry=settings.openai_keepalive_expiry_s,
+            ),
+            "timeout": httpx.Timeout(
+                settings.openai_timeout_s, connect=settings.openai_connect_timeout_s
+            ),
+            "http2": _http2_enabled(),
+        }
+
+    def _count_request(self, stats: ConnectionStats) -> None:
+        with self._stats_lock:
+            stats.requests += 1
+
+    def _count_event(self, stats: ConnectionStats, event_name: str) -> None:
+        """httpcore trace callback: count new connections and handshakes"""
+        if event_name == "connection.connect_tcp.complete":
+            with self._stats_lock:
+                stats.connections_opened += 1
+        elif event_name == "connection.start_tls.complete":
+            with self._stats_lock:
+                stats.tls_handshakes += 1
+
+    @property
+    def sync_client(self) -> OpenAI:
+        with self._lock:
+            self._check_open()
+            if self._sync is None:
+                stats = self.stats["sync"]
+
+                def trace(event_name: str, info: Dict) -> None:
+                    self._count_event(stats, event_name)
+
+                def on_request(request: httpx.Request) -> None:
+                    self._count_request(stats)
+                    request.extensions["trace"] = trace
+
+                self._sync = OpenAI(
+                    api_key=settings.openai_api_key,
+                    base_url=settings.openai_base_url,
+                    http_client=DefaultHttpxClient(
+                        event_hooks={"request": [on_request]}, **self._http_options()
+                    ),
+                )
+            return self._sync
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        with self._lock:
+            self._check_open()
+            if self._async is None or (loop is not None and loop is not self._async_loop):
+                if self._async is not None:
+                    self._close_stale_async(self._async, self._async_loop, loop)
+                stats = self.stats["async"]
+
+                async def trace(event_name: str, info: Dict) -> None:
+                    self._count_event(stats, event_name)
+
+                async def on_request(request: httpx.Request) -> None:
+                    self._count_request(stats)
+                    request.extensions["trace"] = trace
+
+                self._async = AsyncOpenAI(
+                    api_key=settings.openai_api_key,
+                    base_url=settings.openai_base_url,
+                    http_client=DefaultAsyncHttpxClient(
+                        event_hooks={"request": [on_request]}, **self._http_options()
+                    ),
+                )
+                self._async_loop = loop
+            return self._async
+
+    def _check_open(self) -> None:
+        if self._closed:
+            raise RuntimeError("OpenAI clients are closed")
+
+    def _close_stale_async(
+        self,
+        client: AsyncOpenAI,
+        client_loop: Optional[asyncio.AbstractEventLoop],
+        loop: asyncio.AbstractEventLoop,
+    ) -> None:
+        """Close an async client replaced because it belongs to another loop"""
+        if client_loop is not None and client_loop.is_running():
+            # Still serving in another thread; close it there
+            closing = asyncio.run_coroutine_threadsafe(client.close(), client_loop)
+        else:
+            closing = loop.create_task(_close_quietly(client))
+        self._closing.add(closing)
+        closing.add_done_callback(self._closing.discard)
+
+    def open(self) -> None:
+        """Create both clients up front"""
+        with self._lock:
+            self._closed = False
+        self.sync_client
+        self.async_client
+        logger.info(
+            f"🔌 OpenAI clients ready (max {settings.openai_max_connections} connections, "
+            f"http2={_http2_enabled()})"
+        )
+
+    async def close(self) -> None:
+        with self._lock:
+            sync_client, async_client = self._sync, self._async
+            async_loop = self._async_loop
+            self._sync = self._async = self._async_loop = None
+            self._closed = True
+        if sync_client is not None:
+            sync_client.close()
+        if async_client is not None:
+            if async_loop is not None and async_loop.is_closed():
+                await _close_quietly(async_client)
+            else:
+                await async_client.close()
+        logger.info(f"🔌 OpenAI clients closed: {self.connection_stats()}")
+
+    def connection_stats(self) -> Dict:
+        with self._stats_lock:
+            return {name: stats.to_dict() for name, stats in self.stats.items()}
+
+    def render_metrics(self) -> List[str]:
+        stats = self.connection_stats()
+        lines = []
+        for metric, field, documentation in (
+            ("openai_http_requests_total", "requests", "Requests sent to the OpenAI API"),
+            ("openai_connections_opened_total", "connections_opened", "New TCP connections to the OpenAI API"),
+            ("openai_tls_handshakes_total", "tls_handshakes", "TLS handshakes with the OpenAI API"),
+        ):
+            lines.append(f"# HELP {metric} {documentation}")
+            lines.append(f"# TYPE {metric} counter")
+            for client, counts in stats.items():
+                lines.append(f'{metric}{{client="{client}"}} {counts[field]}')
+        return lines
+
+
+openai_clients = OpenAIClients()
+register_collector(openai_clients.render_metrics)
@@ -1,10 +1,17 @@
 import PyPDF2
 import re
 import logging
-from typing import List, Dict
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Callable, Iterator, List, Dict, Optional
 from dataclasses import dataclass
 from pathlib import Path
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from config import settings
+from services.bm25_index import BM25Index
+from services.metrics import INGESTION_STAGE_SECONDS, StageTimer, timed_iter
+from services.tokenizer import count_tokens
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -20,6 +27,7 @@ class DocumentChunk:
     start_char: int
     end_char: int
     word_count: int
+    token_count: int = 0  # For prompt budgeting, counted at ingestion
 
     def to_dict(self) -> Dict:
         return {
@@ -28,9 +36,28 @@ class DocumentChunk:
             "start_char": self.start_char,
             "end_char": self.end_char,
             "word_count": self.word_count,
+            "token_count": self.token_count,
         }
 
 
+def _extract_page_text(page, page_num: int) -> Optional[str]:
+    """Extract one page's text, isolating failures to that page"""
+    try:
+        return page.extract_text()
+    except Exception as e:
+        logger.warning(f"Failed to extract text from page {page_num + 1}: {e}")
+        return None
+
+
+def _extract_page_range(pdf_path: str, start: int, end: int) -> List[Optional[str]]:
+    """Extract pages [start, end) in a worker process"""
+    pdf_reader = PyPDF2.PdfReader(pdf_path)
+    return [
+        _extract_page_text(pdf_reader.pages[page_num], page_num)
+        for page_num in range(start, end)
+    ]
+
+
 class PDFProcessor:
     """Main PDF processing pipeline"""
 
@@ -39,49 +66,86 @@ class PDFProcessor:
         self.pdf_path = Path(pdf_path)
         self.raw_text = ""
         self.pages_text = []
+        self.pages_with_text = 0
         self.chunks = []
+        # Keyword index over self.chunks, keyed by position in the list
+        self.bm25_index = BM25Index()
+
+    def iter_pages(
+        self, progress_callback: Optional[Callable[..., None]] = None
+    ) -> Iterator[str]:
+        """Yield the text of each non-empty page, in order, as it is extracted"""
+        logger.info(f"Loading PDF from: {self.pdf_path}")
+
+        if not self.pdf_path.exists():
+            raise FileNotFoundError(f"PDF file not found: {self.pdf_path}")
+
+        with open(self.pdf_path, "rb") as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+
+            total_pages = len(pdf_reader.pages)
+            logger.info(f"PDF has {total_pages} pages")
+
+            workers = settings.pdf_extraction_workers
+            if workers > 1 and total_pages >= settings.pdf_parallel_min_pages:
+                logger.info(f"Extracting pages with {workers} worker processes")
+                page_texts = self._extract_pages_parallel(total_pages, workers)
+            else:
+                page_texts = (
+                    _extract_page_text(page, page_num)
+                    for page_num, page in enumerate(pdf_reader.pages)
+                )
+
+            for page_num, page_text in enumerate(page_texts):
+                if progress_callback:
+                    progress_callback(
+                        stage="extracting",
+                        pages_extracted=page_num + 1,
+                        total_pages=total_pages,
+                    )
+
+                if page_text and page_text.strip():  # Only yield non-empty pages
+                    self.pages_with_text += 1
+                    yield page_text
+
+        logger.info(f"Successfully extracted text from {self.pages_with_text} pages")
 
-    def load_pdf(self) -> bool:
+    def load_pdf(self, progress_callback: Optional[Callable[..., None]] = None) -> bool:
         """Load and extract text from PDF"""
         try:
-            logger.info(f"Loading PDF from: {self.pdf_path}")
-
-            if not self.pdf_path.exists():
-                raise FileNotFoundError(f"PDF file not found: {self.pdf_path}")
-
-            with open(self.pdf_path, "rb") as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-
-                logger.info(f"PDF has {len(pdf_reader.pages)} pages")
-
-                # Extract text from each page and build continuous raw text
-                all_text_parts = []
-                for page_num, page in enumerate(pdf_reader.pages):
-                    try:
-                        page_text = page.extract_text()
-                        if page_text.strip():  # Only add non-empty pages
-                            self.pages_text.append(
-                                {"page_number": page_num + 1, "text": page_text}
-                            )
-                            all_text_parts.append(page_text)
-                    except Exception as e:
-                        logger.warning(
-                            f"Failed to extract text from page {page_num + 1}: {e}"
-                        )
-                        continue
-
-                # Create continuous raw text without page separators
-                self.raw_text = " ".join(all_text_parts)
-
-                logger.info(
-                    f"Successfully extracted text from {len(self.pages_text)} pages"
-                )
-                return True
+            all_text_parts = []
+            page_number = 0
+            for page_text in self.iter_pages(progress_callback):
+                page_number += 1
+                self.pages_text.append({"page_number": page_number, "text": page_text})
+                all_text_parts.append(page_text)
+
+            # Create continuous raw text without page separators
+            self.raw_text = " ".join(all_text_parts)
+            return True
 
         except Exception as e:
             logger.error(f"Failed to load PDF: {e}")
             return False
 
+    def _extract_pages_parallel(
+        self, total_pages: int, workers: int
+    ) -> Iterator[Optional[str]]:
+        """Extract page text across a process pool, yielding pages in order"""
+        # Several ranges per worker keeps the pool busy when pages vary in cost
+        range_size = max(1, -(-total_pages // (workers * 4)))
+        starts = list(range(0, total_pages, range_size))
+        ends = [min(start + range_size, total_pages) for start in starts]
+
+        # Spawned workers don't inherit the server's threads or locks
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        ) as pool:
+            for page_texts in pool.map(
+                _extract_page_range, repeat(str(self.pdf_path)), starts, ends
+            ):
+                yield from page_texts
+
     def clean_text(self, text: str) -> str:
         """Clean and normalize extracted text"""
         # Remove excessive whitespace
@@ -102,16 +166,31 @@ class PDFProcessor:
 
         return text
 
+    def _make_text_splitter(self) -> RecursiveCharacterTextSplitter:
+        return RecursiveCharacterTextSplitter(
+            chunk_size=400,
+            chunk_overlap=0,
+            separators=["\n\n", "\n", ".", "?", "!", " ", ""],
+        )
+
+    def _make_chunk(self, chunk_text: str, chunk_index: int, start_char: int) -> DocumentChunk:
+        content = chunk_text.strip()
+        return DocumentChunk(
+            content=content,
+            chunk_index=chunk_index,
+            start_char=start_char,
+            end_char=start_char + len(chunk_text),
+            word_count=len(chunk_text.split()),
+            token_count=count_tokens(content, settings.openai_model),
+        )
+
     def create_chunks(self) -> List[DocumentChunk]:
         """Split entire document text into chunks using RecursiveCharacterTextSplitter"""
         chunks = []
+        self.bm25_index = BM25Index()
 
         # Initialize the RecursiveCharacterTextSplitter with specified parameters
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=400,
-            chunk_overlap=0,
-            separators=["\n\n", "\n", ".", "?", "!", " ", ""],
-        )
+        text_splitter = self._make_text_splitter()
 
         # Clean the entire raw text
         # cleaned_text = self.clean_text(self.raw_text)
@@ -130,21 +209,12 @@ class PDFProcessor:
             if not chunk_text.strip():  # Skip empty chunks
                 continue
 
-            # Calculate word count
-            word_count = len(chunk_text.split())
-
-            # Create chunk
-            chunk = DocumentChunk(
-                content=chunk_text.strip(),
-                chunk_index=chunk_index,
-                start_char=start_char,
-                end_char=start_char + len(chunk_text),
-                word_count=word_count,
-            )
-
+            chunk = self._make_chunk(chunk_text, chunk_index, start_char)
+            self.bm25_index.add(len(chunks), chunk.content)
             chunks.append(chunk)
             start_char += len(chunk_text)
 
+        self.bm25_index.compact()
         self.chunks = chunks
 
         logger.info(
@@ -152,13 +222,60 @@ class PDFProcessor:
         )
         return chunks
 
+    def iter_chunks(
+        self,
+        progress_callback: Optional[Callable[..., None]] = None,
+        timer: Optional[StageTimer] = None,
+    ) -> Iterator[DocumentChunk]:
+        """
+        Yield chunks as pages are extracted, without building raw_text.
+
+        Pages are joined the same way load_pdf joins them. After each page
+        the text is split, and the last piece is carried over to the next
+        page since it may continue there. Extraction and chunking time are
+        added to `timer` as the "extract" and "chunk" stages.
+        """
+        timer = timer or StageTimer(INGESTION_STAGE_SECONDS)
+        text_splitter = self._make_text_splitter()
+        self.chunks = []
+        self.bm25_index = BM25Index()
+        carry = ""
+        start_char = 0
+
+        def emit(pieces: List[str]) -> Iterator[DocumentChunk]:
+            nonlocal start_char
+            for piece in pieces:
+                if not piece.strip():  # Skip empty chunks
+                    continue
+                with timer.stage("chunk"):
+                    chunk = self._make_chunk(piece, len(self.chunks), start_char)
+                    self.bm25_index.add(len(self.chunks), chunk.content)
+                self.chunks.append(chunk)
+                start_char += len(piece)
+                yield chunk
+
+        pages = timed_iter(self.iter_pages(progress_callback), timer, "extract")
+        for page_text in pages:
+            with timer.stage("chunk"):
+                carry = f"{carry} {page_text}" if carry else page_text
+                pieces = text_splitter.split_text(carry)
+                carry = pieces.pop() if pieces else ""
+            yield from emit(pieces)
+
+        if carry.strip():
+            with timer.stage("chunk"):
+                pieces = text_splitter.split_text(carry)
+            yield from emit(pieces)
+
+        logger.info(f"Created {len(self.chunks)} chunks while streaming the document")
+
     def get_statistics(self) -> Dict:
         """Get document statistics"""
         total_words = sum(chunk.word_count for chunk in self.chunks)
         total_chars = sum(len(chunk.content) for chunk in self.chunks)
 
         return {
-            "total_pages": len(self.pages_text),
+            "total_pages": self.pages_with_text,
             "total_chunks": len(self.chunks),
             "total_words": total_words,
             "total_characters": total_chars,
@@ -166,17 +283,20 @@ class PDFProcessor:
             "avg_chars_per_chunk": total_chars / len(self.chunks) if self.chunks else 0,
         }
 
-    def process_pipeline(self) -> bool:
+    def process_pipeline(
+        self, progress_callback: Optional[Callable[..., None]] = None
+    ) -> bool:
         """Run the complete processing pipeline"""
         logger.info("Starting PDF processing pipeline...")
 
-        # Step 1: Load PDF
-        if not self.load_pdf():
+        # Steps 1 and 2: Load PDF and create chunks, page by page
+        try:
+            for _ in self.iter_chunks(progress_callback):
+                pass
+        except Exception as e:
+            logger.error(f"Failed to load PDF: {e}")
             return False
 
-        # Step 2: Create chunks
-        self.create_chunks()
-
         # Step 3: Display statistics
         stats = self.get_statistics()
         logger.info("Processing completed!")
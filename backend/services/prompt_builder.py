@@ -0,0 +1,168 @@
+"""
+Token-budgeted prompt assembly
+Fits instructions, retrieved context and conversation history into a fixed
+prompt token budget, filling each part in priority order
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Sequence
+
+from config import settings
+from services.tokenizer import count_tokens
+
+PROMPT_TEMPLATE = """
+You are an intelligent assistant trained on the following PDF content. Answer the user's question based **only** on the context provided below.
+
+If the question isn't related to the context or there's not enough information to answer it meaningfully, respond politely and conversationally — don't guess or make up facts. It's okay to be a bit playful or redirect the user to ask something relevant.
+
+Use the conversation history to understand the context of the current question and provide more relevant, coherent responses.
+
+CONTEXT:
+{context}{conversation_history}
+
+CURRENT QUESTION: {query}
+
+Your response:
+"""
+
+SUMMARY_TEMPLATE = """
+
+SUMMARY OF EARLIER CONVERSATION:
+{summary}
+"""
+
+HISTORY_TEMPLATE = """
+
+CONVERSATION HISTORY:
+{history}
+"""
+
+CONTEXT_SEPARATOR = "\n\n"
+
+
+@dataclass
+class AssembledPrompt:
+    """A prompt together with what went into it"""
+
+    prompt: str
+    chunks: List = field(default_factory=list)  # RelevantChunks, best first
+    history_parts: List[str] = field(default_factory=list)  # Oldest first
+    summary_used: bool = False
+    prompt_tokens: int = 0
+    token_budget: int = 0
+    token_breakdown: Dict[str, int] = field(default_factory=dict)
+
+    def metadata(self) -> Dict:
+        return {
+            "chunks_used": len(self.chunks),
+            "history_messages_used": len(self.history_parts),
+            "summary_used": self.summary_used,
+            "prompt_tokens": self.prompt_tokens,
+            "prompt_token_budget": self.token_budget,
+            "prompt_token_breakdown": self.token_breakdown,
+        }
+
+
+def build_prompt(
+    query: str,
+    relevant_chunks: Sequence,
+    message_history: List[Dict] = None,
+    model: str = None,
+    token_budget: int = None,
+    summary: str = None,
+) -> AssembledPrompt:
+    """
+    Assemble the chat prompt within `token_budget` tokens.
+
+    Instructions and the question are always included. Retrieved chunks are
+    added best first up to the context share of what is left, then the
+    summary of older turns and history from newest to oldest; budget history
+    leaves unused goes back to chunks that did not fit the first time.
+    """
+    model = model or settings.openai_model
+    token_budget = token_budget or settings.prompt_token_budget
+
+    instruction_tokens = count_tokens(
+        PROMPT_TEMPLATE.format(context="", conversation_history="", query=query), model
+    )
+    available = max(0, token_budget - instruction_tokens)
+    separator_tokens = count_tokens(CONTEXT_SEPARATOR, model)
+
+    # Context first, up to its share of the remaining budget
+    context_budget = int(available * settings.prompt_context_share)
+    selected, skipped = [], []
+    context_tokens = 0
+    for relevant in relevant_chunks:
+        tokens = _chunk_tokens(relevant.chunk, model) + separator_tokens
+        if context_tokens + tokens <= context_budget:
+            selected.append(relevant)
+            context_tokens += tokens
+        else:
+            skipped.append((relevant, tokens))
+
+    # Then the summary of older turns, which stands in for them
+    history_budget = available - context_tokens
+    summary_section = SUMMARY_TEMPLATE.format(summary=summary) if summary else ""
+    summary_tokens = count_tokens(summary_section, model) if summary_section else 0
+    if summary_tokens > history_budget:
+        summary_section, summary_tokens = "", 0
+    history_budget -= summary_tokens
+
+    # Then the most recent history; the current message is the last entry
+    history_parts: List[str] = []
+    history_tokens = 0
+    previous_messages = (message_history or [])[:-1]
+    if previous_messages:
+        history_tokens = count_tokens(HISTORY_TEMPLATE.format(history=""), model)
+        for msg in reversed(previous_messages):
+            role = "User" if msg.get("role") == "human" else "Assistant"
+            content = msg.get("message", msg.get("content", ""))
+            if not content.strip():
+                continue
+            part = f"{role}: {content}"
+            tokens = count_tokens(part, model) + 1  # Joining newline
+            # Stop at the first message that does not fit, so the history
+            # the model sees has no gaps
+            if history_tokens + tokens > history_budget:
+                break
+            history_parts.append(part)
+            history_tokens += tokens
+        history_parts.reverse()
+        if not history_parts:
+            history_tokens = 0
+
+    # Give what history left over to chunks that were skipped
+    for relevant, tokens in skipped:
+        if context_tokens + summary_tokens + history_tokens + tokens <= available:
+            selected.append(relevant)
+            context_tokens += tokens
+    # Keep relevance order across both passes
+    order = {id(relevant): i for i, relevant in enumerate(relevant_chunks)}
+    selected.sort(key=lambda relevant: order[id(relevant)])
+
+    context = CONTEXT_SEPARATOR.join(relevant.chunk.content for relevant in selected)
+    conversation_history = summary_section + (
+        HISTORY_TEMPLATE.format(history="\n".join(history_parts)) if history_parts else ""
+    )
+    prompt = PROMPT_TEMPLATE.format(
+        context=context, conversation_history=conversation_history, query=query
+    )
+    return AssembledPrompt(
+        prompt=prompt,
+        chunks=selected,
+        history_parts=history_parts,
+        summary_used=bool(summary_section),
+        prompt_tokens=count_tokens(prompt, model),
+        token_budget=token_budget,
+        token_breakdown={
+            "instructions": instruction_tokens,
+            "context": context_tokens,
+            "summary": summary_tokens,
+            "history": history_tokens,
+        },
+    )
+
+
+def _chunk_tokens(chunk, model: str) -> int:
+    # Indexes persisted before token counts were recorded store 0
+    return chunk.token_count or count_tokens(chunk.content, model)
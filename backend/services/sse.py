@@ -0,0 +1,126 @@
+"""
+Server-Sent Events encoding and adaptive flushing
+Coalesces small content deltas into fewer, compact SSE frames
+"""
+
+import asyncio
+import json
+import logging
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Content frames are by far the most frequent, so their fixed parts are
+# encoded once instead of re-serializing a dict per delta
+_CONTENT_FRAME_PREFIX = 'data: {"type":"content","content":'
+_CONTENT_FRAME_SUFFIX = "}\n\n"
+
+_END_OF_STREAM = object()
+
+
+@dataclass
+class FlushPolicy:
+    """Controls how content deltas are batched into SSE frames"""
+
+    interval_s: float = 0.05  # Max time a delta may wait in the buffer
+    max_bytes: int = 256  # Flush as soon as this many bytes are buffered
+
+    @classmethod
+    def from_settings(cls) -> "FlushPolicy":
+        return cls(
+            interval_s=settings.sse_flush_interval_ms / 1000,
+            max_bytes=settings.sse_flush_max_bytes,
+        )
+
+
+def encode_event(event: Dict) -> str:
+    """Encode an arbitrary event dict as a compact SSE frame"""
+    return f"data: {json.dumps(event, separators=(',', ':'))}\n\n"
+
+
+def encode_content(content: str) -> str:
+    """Encode a content delta as a compact SSE frame"""
+    return _CONTENT_FRAME_PREFIX + json.dumps(content) + _CONTENT_FRAME_SUFFIX
+
+
+def is_content_frame(frame: str) -> bool:
+    return frame.startswith(_CONTENT_FRAME_PREFIX)
+
+
+async def _pump(events: AsyncIterator[Dict], queue: asyncio.Queue) -> None:
+    """Move events from the source generator into the queue"""
+    try:
+        async for event in events:
+            await queue.put(event)
+    except Exception as e:
+        await queue.put(e)
+    finally:
+        await queue.put(_END_OF_STREAM)
+
+
+async def stream_events(
+    events: AsyncIterator[Dict], policy: FlushPolicy = None
+) -> AsyncIterator[str]:
+    """
+    Turn a stream of event dicts into SSE frames.
+
+    The first content delta is flushed immediately to keep time-to-first-token
+    low. Later deltas are buffered until either `policy.interval_s` has passed
+    since the oldest buffered delta or `policy.max_bytes` are pending. Any
+    non-content event flushes the buffer first so ordering is preserved.
+    """
+    policy = policy or FlushPolicy.from_settings()
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    producer = asyncio.create_task(_pump(events, queue))
+
+    buffer = []
+    buffered_bytes = 0
+    deadline = None
+    first_delta = True
+
+    def flush() -> str:
+        nonlocal buffer, buffered_bytes, deadline
+        frame = encode_content("".join(buffer))
+        buffer, buffered_bytes, deadline = [], 0, None
+        return frame
+
+    try:
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield flush()
+                continue
+
+            if item is _END_OF_STREAM:
+                break
+            if isinstance(item, Exception):
+                raise item
+
+            if item.get("type") != "content":
+                if buffer:
+                    yield flush()
+                yield encode_event(item)
+                continue
+
+            buffer.append(item["content"])
+            buffered_bytes += len(item["content"].encode("utf-8"))
+            if (
+                first_delta
+                or buffered_bytes >= policy.max_bytes
+                or policy.interval_s <= 0
+            ):
+                first_delta = False
+                yield flush()
+            elif deadline is None:
+                deadline = loop.time() + policy.interval_s
+
+        if buffer:
+            yield flush()
+    finally:
+        producer.cancel()
@@ -4,10 +4,15 @@ Tracks tokens and estimated costs for the current session
 """
 
 import logging
-from typing import Dict, Optional
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
 from dataclasses import dataclass, field
 from datetime import datetime
 
+from config import settings
+
 logger = logging.getLogger(__name__)
 
 
@@ -19,7 +24,15 @@ class TokenUsage:
     completion_tokens: int = 0
     total_tokens: int = 0
     timestamp: datetime = field(default_factory=datetime.now)
-    call_type: str = "unknown"  # "embedding", "chat", etc.
+    call_type: str = "unknown"  # "embedding", "chat", "summary", etc.
+    model: Optional[str] = None
+    chat_id: Optional[str] = None
+    document_id: Optional[str] = None
+
+    @property
+    def category(self) -> str:
+        """call_type without the model suffix"""
+        return self.call_type.split("-", 1)[0]
 
 
 @dataclass
@@ -31,12 +44,86 @@ class SessionStats:
     total_tokens: int = 0
     embedding_calls: int = 0
     chat_calls: int = 0
+    cache_hits: int = 0  # Answers served from cache, at no token cost
+    summary_calls: int = 0  # Conversation summary updates, also counted in totals
+    summary_tokens: int = 0
     total_api_calls: int = 0
     estimated_cost_usd: float = 0.0
     session_start: datetime = field(default_factory=datetime.now)
     last_updated: datetime = field(default_factory=datetime.now)
 
 
+@dataclass
+class UsageCounts:
+    """Token and cost totals for one slice of usage"""
+
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+    estimated_cost_usd: float = 0.0
+
+    def add(self, usage: TokenUsage, cost: float) -> None:
+        self.calls += 1
+        self.prompt_tokens += usage.prompt_tokens
+        self.completion_tokens += usage.completion_tokens
+        self.total_tokens += usage.total_tokens
+        self.estimated_cost_usd += cost
+
+    def merge(self, other: "UsageCounts") -> None:
+        self.calls += other.calls
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.total_tokens += other.total_tokens
+        self.estimated_cost_usd += other.estimated_cost_usd
+
+    def to_dict(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "estimated_cost_usd": round(self.estimated_cost_usd, 6),
+        }
+
+
+@dataclass
+class UsageBucket:
+    """Usage of all API calls made during one token_usage_bucket_s interval"""
+
+    start: float
+    totals: UsageCounts = field(default_factory=UsageCounts)
+    cache_hits: int = 0
+    by_type: Dict[str, UsageCounts] = field(default_factory=dict)
+    by_model: Dict[str, UsageCounts] = field(default_factory=dict)
+    by_document: Dict[str, UsageCounts] = field(default_factory=dict)
+    by_chat: Dict[str, UsageCounts] = field(default_factory=dict)
+
+    def add(self, usage: TokenUsage, cost: float) -> None:
+        self.totals.add(usage, cost)
+        for counts, key in (
+            (self.by_type, usage.category),
+            (self.by_model, usage.model),
+            (self.by_document, usage.document_id),
+            (self.by_chat, usage.chat_id),
+        ):
+            # Calls without a chat or document (ingestion, summaries) are
+            # only counted in the totals
+            if key is not None:
+                counts.setdefault(key, UsageCounts()).add(usage, cost)
+
+
+def _merge_into(target: Dict[str, UsageCounts], source: Dict[str, UsageCounts]) -> None:
+    for key, counts in source.items():
+        target.setdefault(key, UsageCounts()).merge(counts)
+
+
+def _ranked(counts: Dict[str, UsageCounts], top: Optional[int] = None) -> Dict:
+    """Slices ordered by tokens used, largest first"""
+    ordered = sorted(counts.items(), key=lambda item: item[1].total_tokens, reverse=True)
+    return {key: value.to_dict() for key, value in ordered[:top]}
+
+
 class TokenTracker:
     """Singleton class to track OpenAI API token usage across the session"""
 
@@ -51,7 +138,13 @@ class TokenTracker:
     def __init__(self):
         if not self._initialized:
             self.session_stats = SessionStats()
-            self.call_history: list[TokenUsage] = []
+            # Most recent calls only; long-running totals live in the buckets
+            self.call_history: deque[TokenUsage] = deque(
+                maxlen=settings.token_history_size
+            )
+            self._buckets: deque[UsageBucket] = deque()
+            # Ingestion threads and request handlers record usage concurrently
+            self._lock = threading.Lock()
             self._pricing = {
                 # GPT-3.5-turbo pricing (per 1K tokens)
                 "gpt-3.5-turbo": {
@@ -72,7 +165,13 @@ class TokenTracker:
             TokenTracker._initialized = True
             logger.info("🔢 Token tracker initialized")
 
-    def track_embedding_usage(self, usage_data) -> None:
+    def track_embedding_usage(
+        self,
+        usage_data,
+        model: str = None,
+        chat_id: str = None,
+        document_id: str = None,
+    ) -> None:
         """Track token usage for embedding API calls"""
         if not usage_data:
             return
@@ -82,13 +181,21 @@ class TokenTracker:
             completion_tokens=0,  # Embeddings don't have completion tokens
             total_tokens=getattr(usage_data, "total_tokens", 0),
             call_type="embedding",
+            model=model or settings.embedding_model,
+            chat_id=chat_id,
+            document_id=document_id,
         )
 
         self._add_usage(token_usage)
-        self.session_stats.embedding_calls += 1
         logger.info(f"📊 Embedding tokens: {token_usage.total_tokens}")
 
-    def track_chat_usage(self, usage_data, model: str = "gpt-3.5-turbo") -> None:
+    def track_chat_usage(
+        self,
+        usage_data,
+        model: str = "gpt-3.5-turbo",
+        chat_id: str = None,
+        document_id: str = None,
+    ) -> None:
         """Track token usage for chat completion API calls"""
         if not usage_data:
             return
@@ -98,28 +205,86 @@ class TokenTracker:
             completion_tokens=getattr(usage_data, "completion_tokens", 0),
             total_tokens=getattr(usage_data, "total_tokens", 0),
             call_type=f"chat-{model}",
+            model=model,
+            chat_id=chat_id,
+            document_id=document_id,
         )
 
         self._add_usage(token_usage)
-        self.session_stats.chat_calls += 1
         logger.info(
             f"💬 Chat tokens: prompt={token_usage.prompt_tokens}, completion={token_usage.completion_tokens}, total={token_usage.total_tokens}"
         )
 
+    def track_summary_usage(
+        self, usage_data, model: str = "gpt-3.5-turbo", chat_id: str = None
+    ) -> None:
+        """Track token usage for background conversation summary updates"""
+        if not usage_data:
+            return
+
+        token_usage = TokenUsage(
+            prompt_tokens=getattr(usage_data, "prompt_tokens", 0),
+            completion_tokens=getattr(usage_data, "completion_tokens", 0),
+            total_tokens=getattr(usage_data, "total_tokens", 0),
+            call_type=f"summary-{model}",
+            model=model,
+            chat_id=chat_id,
+        )
+
+        self._add_usage(token_usage)
+        logger.info(f"📝 Summary tokens: total={token_usage.total_tokens}")
+
+    def track_cache_hit(
+        self, model: str = "gpt-3.5-turbo", chat_id: str = None, document_id: str = None
+    ) -> None:
+        """Track a chat answer served from the answer cache (no tokens spent)"""
+        usage = TokenUsage(
+            call_type=f"cache-{model}",
+            model=model,
+            chat_id=chat_id,
+            document_id=document_id,
+        )
+        with self._lock:
+            self.call_history.append(usage)
+            self.session_stats.cache_hits += 1
+            self.session_stats.last_updated = usage.timestamp
+            self._current_bucket().cache_hits += 1
+        logger.info("💾 Chat answer served from cache: 0 tokens")
+
     def _add_usage(self, usage: TokenUsage) -> None:
-        """Add usage to session statistics"""
-        self.call_history.append(usage)
-        self.session_stats.total_prompt_tokens += usage.prompt_tokens
-        self.session_stats.total_completion_tokens += usage.completion_tokens
-        self.session_stats.total_tokens += usage.total_tokens
-        self.session_stats.total_api_calls += 1
-        self.session_stats.last_updated = datetime.now()
-
-        # Update estimated cost
-        self._update_estimated_cost(usage)
-
-    def _update_estimated_cost(self, usage: TokenUsage) -> None:
-        """Calculate and update estimated costs based on current pricing"""
+        """Add usage to session statistics and the current time bucket"""
+        cost = self._estimate_cost(usage)
+        with self._lock:
+            self.call_history.append(usage)
+            stats = self.session_stats
+            stats.total_prompt_tokens += usage.prompt_tokens
+            stats.total_completion_tokens += usage.completion_tokens
+            stats.total_tokens += usage.total_tokens
+            stats.total_api_calls += 1
+            stats.estimated_cost_usd += cost
+            stats.last_updated = usage.timestamp
+            if usage.category == "embedding":
+                stats.embedding_calls += 1
+            elif usage.category == "chat":
+                stats.chat_calls += 1
+            elif usage.category == "summary":
+                stats.summary_calls += 1
+                stats.summary_tokens += usage.total_tokens
+            self._current_bucket().add(usage, cost)
+
+    def _current_bucket(self) -> UsageBucket:
+        """Bucket for the current interval, dropping expired ones; caller holds the lock"""
+        width = settings.token_usage_bucket_s
+        start = time.time() // width * width
+        if not self._buckets or self._buckets[-1].start != start:
+            self._buckets.append(UsageBucket(start))
+            retention_start = start - settings.token_usage_retention_hours * 3600
+            while self._buckets[0].start <= retention_start:
+                self._buckets.popleft()
+        return self._buckets[-1]
+
+    def _estimate_cost(self, usage: TokenUsage) -> float:
+        """Estimated cost of a call based on current pricing"""
         cost = 0.0
 
         if usage.call_type == "embedding":
@@ -127,9 +292,9 @@ class TokenTracker:
             model_pricing = self._pricing.get("text-embedding-ada-002", {})
             cost = (usage.prompt_tokens / 1000) * model_pricing.get("input", 0)
 
-        elif usage.call_type.startswith("chat-"):
+        elif usage.call_type.startswith(("chat-", "summary-")):
             # Extract model name from call_type
-            model = usage.call_type.replace("chat-", "")
+            model = usage.call_type.split("-", 1)[1]
             model_pricing = self._pricing.get(
                 model, self._pricing.get("gpt-3.5-turbo", {})
             )
@@ -140,16 +305,59 @@ class TokenTracker:
             )
             cost = input_cost + output_cost
 
-        self.session_stats.estimated_cost_usd += cost
+        return cost
+
+    def get_window_usage(self, window_minutes: int, top: Optional[int] = None) -> Dict:
+        """
+        Usage over the last `window_minutes`, broken down by call type, model,
+        document and chat. Only the `top` documents and chats by tokens are
+        listed. The window is rounded to whole buckets.
+        """
+        now = time.time()
+        window_start = now - window_minutes * 60
+        totals = UsageCounts()
+        cache_hits = 0
+        breakdowns: List[Dict[str, UsageCounts]] = [{}, {}, {}, {}]
+        with self._lock:
+            for bucket in reversed(self._buckets):
+                if bucket.start + settings.token_usage_bucket_s <= window_start:
+                    break
+                totals.merge(bucket.totals)
+                cache_hits += bucket.cache_hits
+                for target, source in zip(
+                    breakdowns,
+                    (bucket.by_type, bucket.by_model, bucket.by_document, bucket.by_chat),
+                ):
+                    _merge_into(target, source)
+
+        by_type, by_model, by_document, by_chat = breakdowns
+        return {
+            "window_minutes": window_minutes,
+            "window_start": datetime.fromtimestamp(window_start).isoformat(),
+            "window_end": datetime.fromtimestamp(now).isoformat(),
+            **totals.to_dict(),
+            "cache_hits": cache_hits,
+            "by_type": _ranked(by_type),
+            "by_model": _ranked(by_model),
+            "by_document": _ranked(by_document, top),
+            "by_chat": _ranked(by_chat, top),
+        }
 
     def get_session_stats(self) -> Dict:
         """Get current session statistics"""
+        with self._lock:
+            return self._session_stats_dict()
+
+    def _session_stats_dict(self) -> Dict:
         return {
             "total_prompt_tokens": self.session_stats.total_prompt_tokens,
             "total_completion_tokens": self.session_stats.total_completion_tokens,
             "total_tokens": self.session_stats.total_tokens,
             "embedding_calls": self.session_stats.embedding_calls,
             "chat_calls": self.session_stats.chat_calls,
+            "cache_hits": self.session_stats.cache_hits,
+            "summary_calls": self.session_stats.summary_calls,
+            "summary_tokens": self.session_stats.summary_tokens,
             "total_api_calls": self.session_stats.total_api_calls,
             "estimated_cost_usd": round(self.session_stats.estimated_cost_usd, 6),
             "session_duration_minutes": (
@@ -0,0 +1,42 @@
+"""
+Token counting helpers
+Uses tiktoken, falling back to a character-based estimate only when it is
+missing or its encodings cannot be downloaded (offline installs). The
+estimate undercounts non-English text and code.
+"""
+
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# OpenAI's rule of thumb for English text
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("tiktoken is not installed, estimating token counts")
+        return None
+
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # Encodings are downloaded on first use, which can fail offline
+        logger.warning(f"tiktoken unavailable, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str, model: str = "text-embedding-ada-002") -> int:
+    """Count (or estimate) the number of tokens in text for the given model"""
+    if not text:
+        return 0
+    encoding = _get_encoding(model)
+    if encoding is None:
+        return max(1, -(-len(text) // CHARS_PER_TOKEN))
+    return len(encoding.encode(text, disallowed_special=()))
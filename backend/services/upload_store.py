@@ -0,0 +1,176 @@
+"""
+Uploaded PDF storage
+Streams uploads to disk in fixed-size chunks while hashing them, rejects
+oversized request bodies as they arrive, and removes upload files once
+ingestion no longer needs them
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Dict, Set
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Room for multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+@dataclass
+class StoredUpload:
+    """An upload written to disk, named by nothing but a random id"""
+
+    path: Path
+    document_id: str  # sha256 of the content
+    size: int
+
+
+class UploadStore:
+    """Tracks upload files from the moment they are written until discarded"""
+
+    def __init__(self, directory: str = None):
+        self.directory = Path(directory or settings.upload_dir)
+        self._paths: Set[Path] = set()
+        self._lock = threading.Lock()
+
+    def sweep(self) -> None:
+        """Remove files left behind by a previous run"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        leftovers = [path for path in self.directory.iterdir() if path.is_file()]
+        for path in leftovers:
+            path.unlink(missing_ok=True)
+        if leftovers:
+            logger.info(f"🧹 Removed {len(leftovers)} leftover uploads")
+
+    def save(self, source: BinaryIO, max_bytes: int) -> StoredUpload:
+        """
+        Copy an upload to disk in UPLOAD_CHUNK_BYTES pieces, hashing it in
+        the same pass. Blocking; run it off the event loop.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{uuid.uuid4().hex}.pdf"
+        with self._lock:
+            self._paths.add(path)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(path, "wb") as out:
+                while chunk := source.read(UPLOAD_CHUNK_BYTES):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+                    digest.update(chunk)
+                    out.write(chunk)
+        except BaseException:
+            self.discard(path)
+            raise
+        return StoredUpload(path=path, document_id=digest.hexdigest(), size=size)
+
+    def discard(self, path) -> None:
+        path = Path(path)
+        with self._lock:
+            self._paths.discard(path)
+        path.unlink(missing_ok=True)
+
+    def close(self) -> None:
+        """Remove every upload still on disk"""
+        with self._lock:
+            paths = list(self._paths)
+        for path in paths:
+            self.discard(path)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            paths = list(self._paths)
+        return {
+            "files": len(paths),
+            "bytes": sum(path.stat().st_size for path in paths if path.exists()),
+        }
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Rejects an upload with 413 as soon as its request body grows past the
+    limit, before the multipart parser has buffered the rest. Requests
+    declaring a larger Content-Length are rejected without reading the body.
+    """
+
+    def __init__(self, app, path: str, max_bytes: int):
+        self.app = app
+        self.path = path
+        self.limit = max_bytes + MULTIPART_OVERHEAD_BYTES
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != self.path:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length", b"").decode()
+        if content_length.isdigit() and int(content_length) > self.limit:
+            await self._reject(send)
+            return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.limit:
+                    # Looks like a dropped client to the app, which stops parsing
+                    exceeded = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if exceeded:
+                return  # The app's answer to the cut-off body is replaced below
+            response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded:
+                raise
+        if exceeded and not response_started:
+            logger.warning(f"Rejected upload after {received} bytes: over the size limit")
+            await self._reject(send)
+
+    async def _reject(self, send) -> None:
+        body = json.dumps(
+            {
+                "detail": f"File exceeds maximum allowed size "
+                f"({self.max_bytes / (1024 * 1024):.0f}MB)"
+            }
+        ).encode("utf-8")
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 413,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"connection", b"close"),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
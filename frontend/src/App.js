@@ -27,10 +27,24 @@ function App() {
   const fetchAndReconstructConversations = async () => {
     try {
       setIsLoadingMessages(true);
-      const response = await fetch(`${API_BASE_URL}/messages`);
+      // Page through the history instead of fetching it in one response
+      const allMessages = [];
+      let cursor = null;
+      let response;
+      do {
+        const params = new URLSearchParams({ limit: "1000" });
+        if (cursor) {
+          params.set("cursor", cursor);
+        }
+        response = await fetch(`${API_BASE_URL}/messages?${params}`);
+        if (!response.ok) {
+          break;
+        }
+        allMessages.push(...(await response.json()));
+        cursor = response.headers.get("X-Next-Cursor");
+      } while (cursor);
 
       if (response.ok) {
-        const allMessages = await response.json();
         if (allMessages.length > 0) {
           // Group messages by chat_id
           const chatGroups = {};
@@ -46,8 +60,8 @@ function App() {
           const reconstructedChats = Object.keys(chatGroups).map(chatId => {
             // Convert messages for this specific chat
             const chatMessages = chatGroups[chatId].map((msg, index) => {
-              // Alternate roles within each chat: even positions are human, odd are AI
-              const role = index % 2 === 0 ? "human" : "ai";
+              // Older backends omit the role; their chats alternate human and AI
+              const role = msg.role || (index % 2 === 0 ? "human" : "ai");
               return {
                 role: role,
                 content: msg.message,
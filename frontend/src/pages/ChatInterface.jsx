@@ -272,40 +272,24 @@ export default function ChatInterface({ currentChat, onUpdateMessages }) {
 
       const result = await response.json();
 
+      if (response.ok) {
+        // Processing continues in the background, follow its progress
+        followIngestionJob(result, file.name, uploadingToast, event);
+        return;
+      }
+
       // Dismiss the loading toast
       toast.dismiss(uploadingToast);
 
-      if (response.ok) {
-        const sizeInfo = result.file_size_mb
-          ? ` (${result.file_size_mb}MB)`
-          : "";
-        toast.success("PDF uploaded successfully!", {
-          description: `${file.name}${sizeInfo} is ready for chat. You can now ask questions about your document.`,
-        });
-        // Update health status from upload response
-        if (result.health_status) {
-          setHealthStatus(result.health_status);
-          setContextReady(result.health_status.context_provider_ready);
-        }
-        // Refresh token usage after successful file upload
-        refreshUsage();
-      } else {
-        // Handle error response
-        const errorMessage =
-          result.detail?.error ||
-          result.detail ||
-          result.message ||
-          "Unknown error";
-        toast.error("Upload failed", {
-          description: errorMessage,
-        });
-
-        // Update health status from error response if available
-        if (result.detail?.health_status) {
-          setHealthStatus(result.detail.health_status);
-          setContextReady(result.detail.health_status.context_provider_ready);
-        }
-      }
+      // Handle error response
+      const errorMessage =
+        result.detail?.error ||
+        result.detail ||
+        result.message ||
+        "Unknown error";
+      toast.error("Upload failed", {
+        description: errorMessage,
+      });
     } catch (error) {
       // Dismiss the loading toast
       toast.dismiss(uploadingToast);
@@ -316,11 +300,83 @@ export default function ChatInterface({ currentChat, onUpdateMessages }) {
       });
       // On network error, keep current state or fetch fresh status
       fetchHealthStatus();
-    } finally {
+    }
+
+    setIsUploading(false);
+    // Reset file input
+    event.target.value = "";
+  };
+
+  // Describe ingestion progress for the loading toast
+  const describeProgress = (progress) => {
+    if (progress.chunks_indexed) {
+      return `Indexed ${Math.round(progress.percent_indexed)}% of pages, ${progress.chunks_indexed} chunks searchable. You can start chatting.`;
+    }
+    if (progress.stage === "extracting" && progress.total_pages) {
+      return `Extracting text: page ${progress.pages_extracted} of ${progress.total_pages}`;
+    }
+    return "Processing your document, please wait.";
+  };
+
+  // Stream progress of a background ingestion job until it finishes
+  const followIngestionJob = (upload, fileName, uploadingToast, event) => {
+    const eventSource = new EventSource(`${API_BASE_URL}${upload.events_url}`);
+
+    const finish = () => {
+      eventSource.close();
+      toast.dismiss(uploadingToast);
       setIsUploading(false);
       // Reset file input
       event.target.value = "";
-    }
+    };
+
+    eventSource.onmessage = (message) => {
+      try {
+        const data = JSON.parse(message.data);
+        if (data.type === "progress") {
+          toast.loading("Processing PDF...", {
+            id: uploadingToast,
+            description: describeProgress(data.job.progress),
+          });
+          // The document is searchable as soon as its first chunks are indexed
+          if (data.job.progress.chunks_indexed) {
+            setContextReady(true);
+          }
+        } else if (data.type === "done") {
+          finish();
+          const sizeInfo = upload.file_size_mb
+            ? ` (${upload.file_size_mb}MB)`
+            : "";
+          toast.success("PDF uploaded successfully!", {
+            description: `${fileName}${sizeInfo} is ready for chat. You can now ask questions about your document.`,
+          });
+          // Update health status from the job result
+          const healthStatus = data.job.result?.health_status;
+          if (healthStatus) {
+            setHealthStatus(healthStatus);
+            setContextReady(healthStatus.context_provider_ready);
+          }
+          // Refresh token usage after successful processing
+          refreshUsage();
+        } else if (data.type === "error") {
+          finish();
+          toast.error("Upload failed", {
+            description: data.error || "Failed to process the uploaded PDF",
+          });
+          fetchHealthStatus();
+        }
+      } catch (parseError) {
+        console.error("Error parsing job progress:", parseError);
+      }
+    };
+
+    eventSource.onerror = () => {
+      finish();
+      toast.error("Upload failed", {
+        description: "Lost connection while processing the document.",
+      });
+      fetchHealthStatus();
+    };
   };
 
   return (